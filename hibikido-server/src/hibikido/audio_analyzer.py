@@ -3,16 +3,49 @@ Combined audio analyzer for Hibikidō - does both Bark and Energy analysis on lo
 This is the primary interface for all audio analysis operations.
 """
 
+import os
+import threading
 import numpy as np
-import librosa
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple, Optional
 import logging
+from .audio_loader import load_audio
 from .bark_analyzer import BarkAnalyzer
 from .energy_analyzer import EnergyAnalyzer
 from .feature_extractor import AudioFeatureExtractor
 
 logger = logging.getLogger(__name__)
 
+# Runs feature extraction alongside Bark/energy analysis (both are NumPy/FFT
+# bound and release the GIL); created on first use
+# Each analysis submits exactly one extraction and the OSC server handles one
+# request at a time, so more workers would only contend with the band pool
+# and numba/FFT threads
+FEATURE_WORKERS = 1
+_feature_pool: Optional[ThreadPoolExecutor] = None
+_feature_pool_lock = threading.Lock()
+
+
+def _get_feature_pool() -> ThreadPoolExecutor:
+    """Shared pool for concurrent feature extraction."""
+    global _feature_pool
+    with _feature_pool_lock:
+        if _feature_pool is None:
+            _feature_pool = ThreadPoolExecutor(max_workers=FEATURE_WORKERS,
+                                               thread_name_prefix="features")
+        return _feature_pool
+
+
+def _reset_feature_pool():
+    """Forked processes must not reuse the parent's threads."""
+    global _feature_pool, _feature_pool_lock
+    _feature_pool = None
+    _feature_pool_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_feature_pool)
+
 
 class AudioAnalyzer:
     """Combined analyzer that performs both Bark band and energy analysis on pre-loaded audio."""
@@ -30,7 +63,8 @@ class AudioAnalyzer:
         self.feature_extractor = AudioFeatureExtractor(sample_rate)
         
     def analyze_audio_data(self, y: np.ndarray, sr: int, start_time: float = 0.0, 
-                          end_time: Optional[float] = None) -> Dict:
+                          end_time: Optional[float] = None,
+                          onset_envelopes: Optional[Dict[str, np.ndarray]] = None) -> Dict:
         """
         Perform complete audio analysis on loaded audio data.
         
@@ -39,6 +73,9 @@ class AudioAnalyzer:
             sr: Sample rate
             start_time: Start time in seconds
             end_time: End time in seconds (None = full audio)
+            onset_envelopes: Band envelopes of the whole of y from
+                EnergyAnalyzer.precompute_onset_envelopes(), reused instead of
+                recomputing onset strength for this segment
             
         Returns:
             Dictionary with all analysis results:
@@ -66,16 +103,27 @@ class AudioAnalyzer:
             if len(y_segment) == 0:
                 raise ValueError(f"Invalid time segment: {start_time}s to {end_time}s")
             
+            # Comprehensive features (the heaviest pass) run on a pool thread
+            # while Bark and energy analysis run here
+            features_future = _get_feature_pool().submit(
+                self.feature_extractor.extract_features_from_audio, y_segment, sr
+            )
+            
             # Perform Bark analysis using the analyzer
             bark_bands_raw, _ = self.bark_analyzer.analyze_audio_data(y, sr, start_time, end_time)
             bark_norm = BarkAnalyzer.vector_norm(bark_bands_raw)
             
             # Perform energy analysis using the analyzer
-            energy_results = self.energy_analyzer.analyze_energy_data(y, sr, start_time, end_time)
+            if onset_envelopes is not None:
+                energy_results = self.energy_analyzer.analyze_energy_from_envelopes(
+                    onset_envelopes, sr, start_time, end_time
+                )
+            else:
+                energy_results = self.energy_analyzer.analyze_energy_data(y, sr, start_time, end_time)
             total_onsets = len(energy_results.get('onset_times_low_mid', [])) + len(energy_results.get('onset_times_mid', [])) + len(energy_results.get('onset_times_high_mid', []))
             
-            # Extract comprehensive features
-            features = self.feature_extractor.extract_features_from_audio(y_segment, sr)
+            # Collect comprehensive features
+            features = features_future.result()
             
             logger.debug(f"Combined analysis: {duration:.2f}s, Bark norm: {bark_norm:.3f}, "
                         f"{total_onsets} total onsets across 3 bands")
@@ -110,7 +158,7 @@ class AudioAnalyzer:
         """
         try:
             # Load audio file once
-            y, sr = librosa.load(audio_path, sr=None)  # Preserve original sample rate
+            y, sr = load_audio(audio_path)  # Preserve original sample rate
             
             # Perform combined analysis on loaded data
             return self.analyze_audio_data(y, sr, start_time, end_time)
@@ -138,7 +186,8 @@ def analyze_audio_file(audio_path: str, start_time: float = 0.0,
 
 
 def analyze_loaded_audio(y: np.ndarray, sr: int, start_time: float = 0.0, 
-                        end_time: Optional[float] = None) -> Dict:
+                        end_time: Optional[float] = None,
+                        onset_envelopes: Optional[Dict[str, np.ndarray]] = None) -> Dict:
     """
     Convenience function to analyze loaded audio data with both Bark and energy features.
     
@@ -147,9 +196,10 @@ def analyze_loaded_audio(y: np.ndarray, sr: int, start_time: float = 0.0,
         sr: Sample rate
         start_time: Start time in seconds
         end_time: End time in seconds (None = full audio)
+        onset_envelopes: Optional precomputed band envelopes for the whole of y
         
     Returns:
         Dictionary with complete analysis results
     """
     analyzer = AudioAnalyzer(sr)
-    return analyzer.analyze_audio_data(y, sr, start_time, end_time)
\ No newline at end of file
+    return analyzer.analyze_audio_data(y, sr, start_time, end_time, onset_envelopes)
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""
+Hibikidō audio loader - decodes audio files once and shares the buffer.
+
+Handlers and analyzers that work on several segments of the same file
+go through load_audio() so the file is decoded a single time. enable_fftw()
+switches librosa to pyFFTW when the server configuration asks for it.
+"""
+
+import os
+from functools import lru_cache
+from typing import Optional, Tuple
+import numpy as np
+import scipy.fft
+import librosa
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Decoded files kept in memory by default (full recordings can be large);
+# audio.decode_cache_size in the server config overrides it
+CACHE_SIZE = 1
+
+# Resampler used only when a target rate is requested; the quick soxr mode is
+# ample for onset and spectral analysis
+RESAMPLE_TYPE = 'soxr_qq'
+
+
+def enable_fftw(threads: int = 1) -> bool:
+    """
+    Route librosa's FFTs through pyFFTW (planned, multi-threaded) if available.
+
+    This changes process-wide state (scipy.fft's global backend on librosa >= 0.11),
+    so it only runs when the configuration opts in.
+
+    Args:
+        threads: FFTW threads per transform, capped at the CPU count
+
+    Returns:
+        True if pyFFTW is now in use
+    """
+    try:
+        import pyfftw
+        import pyfftw.interfaces.numpy_fft
+        import pyfftw.interfaces.scipy_fft
+    except ImportError:
+        logger.warning("use_fftw is set but pyFFTW is not installed (pip install -e \".[fft]\")")
+        return False
+    pyfftw.config.NUM_THREADS = max(1, min(threads, os.cpu_count() or 1))
+    pyfftw.interfaces.cache.enable()  # Keep FFT plans alive between STFT calls
+    if librosa.get_fftlib() is scipy.fft:
+        # librosa >= 0.11 calls scipy.fft, which dispatches to the global backend
+        scipy.fft.set_global_backend(pyfftw.interfaces.scipy_fft)
+    else:
+        librosa.set_fftlib(pyfftw.interfaces.numpy_fft)
+    logger.info(f"Using pyFFTW for librosa FFTs ({pyfftw.config.NUM_THREADS} threads)")
+    return True
+
+
+def load_audio(audio_path: str, sr: Optional[int] = None) -> Tuple[np.ndarray, int]:
+    """
+    Load an audio file as mono, reusing the decoded buffer while the file is unchanged.
+
+    Args:
+        audio_path: Path to audio file
+        sr: Target sample rate (None = preserve original sample rate)
+
+    Returns:
+        (y, sr) - y is read-only because it is shared between callers
+    """
+    stat = os.stat(audio_path)
+    return _load_cached(os.path.abspath(audio_path), stat.st_mtime_ns, stat.st_size, sr)
+
+
+def clear_audio_cache():
+    """Drop all cached decoded audio."""
+    _load_cached.cache_clear()
+
+
+def set_audio_cache_size(size: int):
+    """Keep up to size decoded files in memory (0 disables caching); drops the current cache."""
+    global _load_cached
+    _load_cached = lru_cache(maxsize=max(0, size))(_decode)
+
+
+def _decode(audio_path: str, mtime_ns: int, size: int, sr: Optional[int]) -> Tuple[np.ndarray, int]:
+    """Decode once per (path, mtime, size, sr); a modified file gets a new key."""
+    y, sr = librosa.load(audio_path, sr=sr, mono=True, dtype=np.float32, res_type=RESAMPLE_TYPE)
+    y.setflags(write=False)
+    logger.debug(f"Decoded {audio_path}: {len(y) / sr:.2f}s at {sr}Hz")
+    return y, sr
+
+
+_load_cached = lru_cache(maxsize=CACHE_SIZE)(_decode)
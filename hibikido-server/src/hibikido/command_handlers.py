@@ -9,12 +9,39 @@ OSC command implementations.
 import json
 import logging
 import os
-from typing import Dict, Any
+from sys import intern
+from typing import Dict, Any, Tuple
+import librosa
+import soundfile as sf
 from .audio_analyzer import analyze_loaded_audio
+from .audio_loader import clear_audio_cache, load_audio
+from .energy_analyzer import precompute_onset_envelopes
+from .orchestrator import ZERO_BARK_BANDS
 from .visualizer import AudioVisualizer
 
 logger = logging.getLogger(__name__)
 
+# Segment fields served from TinyDB Document attributes rather than keys
+SEGMENT_ATTR_FIELDS = frozenset({'doc_id'})
+
+# Sentinel for missing fields (None is a valid stored value)
+_MISSING = object()
+
+
+def _audio_info(path: str) -> Tuple[int, float, int]:
+    """
+    Read (sample_rate, duration, frames) from the file header without decoding.
+    Formats libsndfile cannot open (e.g. mp3/m4a on older builds) go through
+    librosa's audioread fallback instead.
+    """
+    try:
+        info = sf.info(path)
+    except sf.SoundFileRuntimeError:
+        sr = librosa.get_samplerate(path)
+        duration = librosa.get_duration(path=path)
+        return sr, duration, round(duration * sr)
+    return info.samplerate, info.frames / info.samplerate, info.frames
+
 
 class CommandHandlers:
     """Handles all OSC command implementations."""
@@ -28,6 +55,11 @@ class CommandHandlers:
         self.osc_handler = osc_handler
         self.orchestrator = orchestrator
         self.visualizer = AudioVisualizer(config.get('audio', {}).get('sample_rate', 44100))  # Will use native SR
+        
+        # Settings read on every request, resolved once
+        self._top_k = config['search']['top_k']
+        self._min_score = config['search']['min_score']
+        self._audio_dir = config.get('audio', {}).get('audio_directory', '../hibikido-data/audio')
     
     def handle_invoke(self, unused_addr: str, *args):
         """
@@ -38,7 +70,7 @@ class CommandHandlers:
         """
         try:
             parsed = self.osc_handler.parse_args(*args)
-            incantation = parsed.get('arg1', '').strip()
+            incantation = intern(parsed[0].strip() if parsed else '')  # Repeated short queries share one object
             
             if not incantation:
                 self.osc_handler.send_error("invoke requires incantation text")
@@ -49,7 +81,7 @@ class CommandHandlers:
             # Search with MongoDB lookups
             results = self.embedding_manager.search(
                 incantation, 
-                self.config['search']['top_k'],
+                self._top_k,
                 db_manager=self.db_manager
             )
             
@@ -61,44 +93,63 @@ class CommandHandlers:
             segment_results = [r for r in results if r["collection"] == "segments"]
             
             # Filter by minimum score
-            min_score = self.config['search']['min_score']
+            min_score = self._min_score
             segment_results = [r for r in segment_results if r["score"] >= min_score]
             
             if not segment_results:
                 self.osc_handler.send_confirm("no segment resonance found")
                 return
             
-            # Queue ALL results for orchestrator processing
+            # Only prepare as many results as the orchestrator can still queue
+            available_slots = self.orchestrator.available_slots()
+            if available_slots <= 0:
+                self.osc_handler.send_error("orchestrator queue full")
+                return
+            segment_results = segment_results[:available_slots]
+            
+            # Queue results for orchestrator processing
+            # Bind hot-loop callables once instead of resolving them per result
+            queue_manifestation = self.orchestrator.queue_manifestation
+            available = self.orchestrator.available_slots
+            describe = self._create_display_description
+            dumps = json.dumps
+            
             queued_count = 0
             for i, result in enumerate(segment_results):
                 document = result["document"]
+                get = document.get
+                source_path = get("source_path", "")
                 
                 # Extract metadata for orchestrator
-                bark_bands_raw = document.get("bark_bands_raw", [0.0] * 24)
-                bark_norm = document.get("bark_norm", 0.0)
-                sound_id = str(getattr(document, 'doc_id', document.get('source_path', 'unknown')))
+                bark_bands_raw = get("bark_bands_raw", ZERO_BARK_BANDS)
+                bark_norm = get("bark_norm", 0.0)
+                doc_id = getattr(document, 'doc_id', None)
+                if doc_id is not None:
+                    segment_id = sound_id = str(doc_id)
+                else:
+                    segment_id = 'unknown'
+                    sound_id = str(get('source_path', 'unknown'))
                 
-                # Prepare manifestation data
-                segment_id = str(getattr(document, 'doc_id', 'unknown'))
+                # Prepare manifestation data (a literal builds with one constant key tuple)
                 manifestation_data = {
                     "index": i,
                     "collection": "segments",
                     "score": float(result["score"]),
-                    "path": str(document.get("source_path", "")),
-                    "description": self._create_display_description(
-                        document.get("embedding_text", "")
-                    ),
-                    "start": float(document.get("start", 0.0)),
-                    "end": float(document.get("end", 1.0)),
-                    "parameters": json.dumps({"segment_id": segment_id}),
+                    "path": str(source_path),
+                    "description": describe(get("embedding_text", "")),
+                    "start": float(get("start", 0.0)),
+                    "end": float(get("end", 1.0)),
+                    "parameters": dumps({"segment_id": segment_id}),
                     "sound_id": sound_id,
                     "bark_bands_raw": bark_bands_raw,
                     "bark_norm": bark_norm
                 }
                 
                 # Queue for orchestrator (immediate processing per sound)
-                if self.orchestrator.queue_manifestation(manifestation_data):
+                if queue_manifestation(manifestation_data):
                     queued_count += 1
+                elif not available():
+                    break  # Queue filled up, skip building the remaining results
             
             # Simple confirmation - no completion signal
             self.osc_handler.send_confirm(f"invoked: {queued_count} resonances queued")
@@ -164,24 +215,33 @@ class CommandHandlers:
                 return
             
             # Resolve audio path from config
-            audio_dir = self.config.get('audio_directory', '../hibikido-data/audio')
-            full_audio_path = os.path.join(audio_dir, relative_path)
+            full_audio_path = os.path.join(self._audio_dir, relative_path)
             
             # Check if file exists
             if not os.path.exists(full_audio_path):
                 self.osc_handler.send_error(f"audio file not found: {full_audio_path}")
                 return
             
-            # Get basic duration for recording metadata - no downsampling, preserve original SR
+            # Reject duplicates before paying for a full decode
+            if self.db_manager.get_recording_by_path(relative_path):
+                self.osc_handler.send_error(f"recording already exists or failed to add: {relative_path}")
+                return
+            
+            # Decode and analyze before writing anything, so an unreadable file leaves no trace
             try:
-                import librosa
-                y, sr = librosa.load(full_audio_path, sr=None)  # Preserve original sample rate
+                y, sr = load_audio(full_audio_path)  # Preserve original sample rate
                 duration = len(y) / sr
                 logger.info(f"Recording duration: {duration:.2f}s at {sr}Hz")
             except Exception as e:
                 self.osc_handler.send_error(f"failed to load audio file: {e}")
                 return
             
+            analysis = analyze_loaded_audio(y, sr)
+            total_onsets = len(analysis['onset_times_low_mid']) + len(analysis['onset_times_mid']) + len(analysis['onset_times_high_mid'])
+            logger.info(f"Segment analysis: {analysis['duration']:.2f}s at {sr}Hz, "
+                       f"Bark norm: {analysis['bark_norm']:.3f}, "
+                       f"{total_onsets} total onsets across 3 bands")
+            
             # Prepare metadata (no features yet - will be added in segment analysis)
             metadata = {
                 'description': description,
@@ -210,13 +270,6 @@ class CommandHandlers:
             # Add embedding
             faiss_id = self.embedding_manager.add_embedding(segment_embedding_text)
             
-            # Perform complete analysis for the segment using already loaded audio
-            analysis = analyze_loaded_audio(y, sr)
-            total_onsets = len(analysis['onset_times_low_mid']) + len(analysis['onset_times_mid']) + len(analysis['onset_times_high_mid'])
-            logger.info(f"Segment analysis: {analysis['duration']:.2f}s at {sr}Hz, "
-                       f"Bark norm: {analysis['bark_norm']:.3f}, "
-                       f"{total_onsets} total onsets across 3 bands")
-                       
             # No longer storing features in recording - only in segments
             
             # Add auto-segment with complete analysis including features (no duration stored)
@@ -240,19 +293,23 @@ class CommandHandlers:
                 self.osc_handler.send_confirm(f"added recording: {relative_path} with auto-segment")
                 logger.info(f"Added recording: {relative_path} with auto-segment at FAISS {faiss_id}")
             else:
+                # Keep FAISS ids in step with the database: drop the unused vector
+                self.embedding_manager.discard_embeddings([faiss_id])
                 self.osc_handler.send_confirm(f"added recording: {relative_path} (segment creation failed)")
                 
         except Exception as e:
             error_msg = f"add_recording failed: {e}"
             logger.error(error_msg)
             self.osc_handler.send_error(error_msg)
+        finally:
+            clear_audio_cache()  # Don't hold the whole recording between requests
 
     def handle_add_effect(self, unused_addr: str, *args):
         """Handle add effect requests."""
         try:
             parsed = self.osc_handler.parse_args(*args)
-            path = parsed.get('arg1', '').strip()
-            metadata_str = parsed.get('arg2', '{}')
+            path = parsed[0].strip() if parsed else ''
+            metadata_str = parsed[1] if len(parsed) > 1 else '{}'
             
             if not path:
                 self.osc_handler.send_error("add_effect requires effect path")
@@ -334,14 +391,13 @@ class CommandHandlers:
                     self.osc_handler.send_error("metadata must be name/value pairs")
                     return
                 for i in range(2, len(args), 2):
-                    key = str(args[i])
+                    key = intern(str(args[i]))
                     value = str(args[i + 1]) if i + 1 < len(args) else ""
                     metadata[key] = value
 
             segmentation_id = metadata.get('segmentation_id', 'manual')
             start = float(metadata.get('start', 0.0))
             end = float(metadata.get('end', 1.0))
-            duration = float(metadata.get('duration', 0.0))
 
             if not source_path:
                 self.osc_handler.send_error("source_path required")
@@ -356,12 +412,10 @@ class CommandHandlers:
                 return
             
             # Get full audio path for analysis
-            audio_dir = self.config.get('audio_directory', '../hibikido-data/audio')
-            full_audio_path = os.path.join(audio_dir, source_path)
+            full_audio_path = os.path.join(self._audio_dir, source_path)
             
             # Load audio and analyze this segment - preserve original sample rate
-            import librosa
-            y, sr = librosa.load(full_audio_path, sr=None)
+            y, sr = load_audio(full_audio_path)
             
             # Convert relative times to absolute for analysis
             total_duration = recording['duration']
@@ -392,7 +446,6 @@ class CommandHandlers:
                 description=description,
                 embedding_text=embedding_text,
                 faiss_index=faiss_id,
-                duration=duration,
                 bark_bands_raw=analysis['bark_bands_raw'],
                 bark_norm=analysis['bark_norm'],
                 onset_times_low_mid=analysis['onset_times_low_mid'],
@@ -412,12 +465,134 @@ class CommandHandlers:
             logger.error(error_msg)
             self.osc_handler.send_error(error_msg)
 
+    def handle_add_segments_batch(self, unused_addr: str, *args):
+        """
+        Handle batched add segment requests for a single recording.
+
+        OSC: /add_segments_batch "source_path" '[{"start": 0.1, "end": 0.3, "description": "..."}, ...]'
+        Decodes the recording once, analyzes every segment from the same buffer,
+        embeds all texts in one batch and stores the segments in one insert.
+        Each entry may also carry "segmentation_id" (default "manual").
+        """
+        try:
+            if len(args) < 2:
+                self.osc_handler.send_error(
+                    "add_segments_batch requires source_path and segments JSON")
+                return
+
+            source_path = str(args[0]).strip()
+            if not source_path:
+                self.osc_handler.send_error("add_segments_batch requires source_path")
+                return
+
+            try:
+                entries = json.loads(str(args[1]))
+            except json.JSONDecodeError:
+                self.osc_handler.send_error("invalid segments JSON")
+                return
+
+            if not isinstance(entries, list) or not entries:
+                self.osc_handler.send_error("segments JSON must be a non-empty list")
+                return
+
+            # Validate everything before paying for the audio decode
+            requests = []
+            for n, entry in enumerate(entries):
+                if not isinstance(entry, dict):
+                    self.osc_handler.send_error(f"segment {n} must be an object")
+                    return
+                description = str(entry.get('description', '')).strip()
+                if not description:
+                    self.osc_handler.send_error(f"segment {n} requires description")
+                    return
+                try:
+                    start = float(entry.get('start', 0.0))
+                    end = float(entry.get('end', 1.0))
+                except (TypeError, ValueError):
+                    self.osc_handler.send_error(f"segment {n} has non-numeric start/end")
+                    return
+                if not (0.0 <= start <= 1.0) or not (0.0 <= end <= 1.0) or start >= end:
+                    self.osc_handler.send_error(
+                        f"segment {n} has invalid start/end values (must be 0.0-1.0)")
+                    return
+                segmentation_id = str(entry.get('segmentation_id', 'manual'))
+                requests.append((start, end, description, segmentation_id))
+
+            recording = self.db_manager.get_recording_by_path(source_path)
+            if not recording:
+                self.osc_handler.send_error(f"recording not found: {source_path}")
+                return
+
+            # Load audio once for all segments - preserve original sample rate
+            full_audio_path = os.path.join(self._audio_dir, source_path)
+            y, sr = load_audio(full_audio_path)
+
+            # Onset envelopes for the whole file, sliced per segment
+            onset_envelopes = precompute_onset_envelopes(y, sr)
+
+            # Analyze and build every document before anything reaches the FAISS index
+            total_duration = recording['duration']
+            segments = []
+            for start, end, description, segmentation_id in requests:
+                analysis = analyze_loaded_audio(y, sr, start * total_duration, end * total_duration,
+                                                onset_envelopes)
+                embedding_text = self.text_processor.create_segment_embedding_text(
+                    segment={'description': description},
+                    recording=recording,
+                    segmentation={'description': f'Manual segmentation: {segmentation_id}'}
+                )
+                if not embedding_text.strip():
+                    self.osc_handler.send_error("failed to create embedding text")
+                    return
+                segments.append({
+                    "source_path": source_path,
+                    "segmentation_id": segmentation_id,
+                    "start": start,
+                    "end": end,
+                    "description": description,
+                    "embedding_text": embedding_text,
+                    "bark_bands_raw": analysis['bark_bands_raw'],
+                    "bark_norm": analysis['bark_norm'],
+                    "onset_times_low_mid": analysis['onset_times_low_mid'],
+                    "onset_times_mid": analysis['onset_times_mid'],
+                    "onset_times_high_mid": analysis['onset_times_high_mid'],
+                    "features": analysis['features']
+                })
+
+            # One batched encode for the whole request
+            faiss_ids = self.embedding_manager.add_embeddings(
+                [segment["embedding_text"] for segment in segments])
+            if any(faiss_id is None for faiss_id in faiss_ids):
+                self.embedding_manager.discard_embeddings(faiss_ids)
+                self.osc_handler.send_error("failed to create embeddings")
+                return
+
+            for segment, faiss_id in zip(segments, faiss_ids):
+                segment["FAISS_index"] = faiss_id
+
+            doc_ids = self.db_manager.add_segments(segments)
+            if doc_ids:
+                self.osc_handler.send_confirm(f"added {len(doc_ids)} segments for {source_path}")
+                logger.info(f"Added {len(doc_ids)} segments for {source_path} "
+                           f"at FAISS {faiss_ids[0]}-{faiss_ids[-1]}")
+            else:
+                # Keep FAISS ids in step with the database: drop the unused vectors
+                self.embedding_manager.discard_embeddings(faiss_ids)
+                self.osc_handler.send_error("failed to add segments to database")
+
+        except Exception as e:
+            error_msg = f"add_segments_batch failed: {e}"
+            logger.error(error_msg)
+            self.osc_handler.send_error(error_msg)
+        finally:
+            clear_audio_cache()  # Don't hold the whole recording between requests
+
     def handle_add_preset(self, unused_addr: str, *args):
         """Handle add preset requests."""
         try:
             parsed = self.osc_handler.parse_args(*args)
-            description = parsed.get('arg1', '').strip()
-            metadata_str = parsed.get('arg2', '{}')
+            description = parsed[0].strip() if parsed else ''
+            metadata_str = parsed[1] if len(parsed) > 1 else '{}'
             
             if not description:
                 self.osc_handler.send_error("add_preset requires description")
@@ -499,27 +674,33 @@ class CommandHandlers:
             embedding_count = self.embedding_manager.get_total_embeddings()
             orch_stats = self.orchestrator.get_stats()
             
+            # Read each value once so the text and structured replies agree
+            recordings = stats.get("recordings", 0)
+            segments = stats.get("segments", 0)
+            effects = stats.get("effects", 0)
+            presets = stats.get("presets", 0)
+            active = orch_stats["active_niches"]
+            queued = orch_stats["queued_requests"]
+            
+            rebuild = " (orphaned, run /rebuild_index)" if self.embedding_manager.needs_rebuild else ""
+            
             # Send detailed stats
-            stats_msg = (f"Database: {stats.get('recordings', 0)} recordings, "
-                        f"{stats.get('segments', 0)} segments, "
-                        f"{stats.get('effects', 0)} effects, "
-                        f"{stats.get('presets', 0)} presets. "
-                        f"FAISS: {embedding_count} embeddings. "
-                        f"Orchestrator: {orch_stats['active_niches']} active, "
-                        f"{orch_stats['queued_requests']} queued")
+            stats_msg = (f"Database: {recordings} recordings, "
+                        f"{segments} segments, "
+                        f"{effects} effects, "
+                        f"{presets} presets. "
+                        f"FAISS: {embedding_count} embeddings{rebuild}. "
+                        f"Orchestrator: {active} active, "
+                        f"{queued} queued. "
+                        f"OSC: {self.osc_handler.dropped} dropped")
             
             self.osc_handler.send_confirm(stats_msg)
             
             # Also send as structured data
-            self.osc_handler.client.send_message("/stats_result", [
-                stats.get("recordings", 0),
-                stats.get("segments", 0),
-                stats.get("effects", 0),
-                stats.get("presets", 0),
-                embedding_count,
-                orch_stats["active_niches"],
-                orch_stats["queued_requests"]
-            ])
+            self.osc_handler.client.send_message("/stats_result", (
+                recordings, segments, effects, presets,
+                embedding_count, active, queued
+            ))
             
             logger.info(f"Stats: {stats_msg}")
             
@@ -602,14 +783,7 @@ class CommandHandlers:
                 
             logger.info(f"Visualizing segment: {segment_id}")
             
-            # Get all segments and find the requested one by doc_id
-            segments = self.db_manager.get_all_segments()
-            segment = None
-            
-            for s in segments:
-                if s.doc_id == segment_id:
-                    segment = s
-                    break
+            segment = self.db_manager.get_segment_by_doc_id(segment_id)
                     
             if not segment:
                 self.osc_handler.send_error(f"segment {segment_id} not found")
@@ -624,8 +798,7 @@ class CommandHandlers:
                 return
                 
             # Resolve full audio path
-            audio_dir = self.config.get('audio_directory', '../hibikido-data/audio')
-            full_audio_path = os.path.join(audio_dir, source_path)
+            full_audio_path = os.path.join(self._audio_dir, source_path)
             
             # Check if file exists
             if not os.path.exists(full_audio_path):
@@ -642,8 +815,27 @@ class CommandHandlers:
             start_time = start_ratio * total_duration
             end_time = end_ratio * total_duration
                 
+            # Decode only the segment window; soundfile seeks straight to it
+            sr, _, _ = _audio_info(full_audio_path)
+            start_frame = int(start_time * sr)
+            frames = max(int((end_time - start_time) * sr), 0)
+            try:
+                y_segment, sr = sf.read(full_audio_path, start=start_frame, frames=frames,
+                                        dtype='float32', always_2d=True)
+                y_segment = y_segment.mean(axis=1)  # Mix down to mono like librosa.load
+            except sf.SoundFileRuntimeError:
+                # Not seekable through libsndfile: decode the whole file (cached) and slice
+                y, sr = load_audio(full_audio_path)
+                y_segment = y[start_frame:start_frame + frames]
+            
+            if len(y_segment) == 0:
+                self.osc_handler.send_error(f"empty audio window for segment {segment_id}")
+                return
+            
             # Create visualization
-            self.visualizer.visualize_segment_multiband(full_audio_path, start_time, end_time)
+            self.visualizer.visualize_segment_multiband_audio(
+                y_segment, sr, f"{full_audio_path} ({start_time:.1f}s - {end_time:.1f}s)"
+            )
             
             self.osc_handler.send_confirm(f"visualized segment {segment_id}")
             logger.info(f"Successfully visualized segment {segment_id}")
@@ -694,8 +886,8 @@ class CommandHandlers:
         """
         try:
             parsed = self.osc_handler.parse_args(*args)
-            segment_id_str = parsed.get('arg1', '').strip()
-            field_name = parsed.get('arg2', '').strip()
+            segment_id_str = parsed[0].strip() if parsed else ''
+            field_name = parsed[1].strip() if len(parsed) > 1 else ''
 
             if not segment_id_str or not field_name:
                 self.osc_handler.send_error("get_segment_field requires segment_id and field_name")
@@ -707,35 +899,24 @@ class CommandHandlers:
                 self.osc_handler.send_error(f"invalid segment_id: {segment_id_str}")
                 return
 
-            # Get all segments and find the requested one by doc_id
-            segments = self.db_manager.get_all_segments()
-            target_segment = None
-            for s in segments:
-                if s.doc_id == segment_id:
-                    target_segment = s
-                    break
+            target_segment = self.db_manager.get_segment_by_doc_id(segment_id)
 
             if target_segment is None:
                 self.osc_handler.send_error(f"segment not found: {segment_id}")
                 return
 
-            # Get the requested field
-            if hasattr(target_segment, field_name):
+            # Get the requested field: Document attribute, stored key, then nested value
+            # like "features.spectral_entropy_mean"
+            if field_name in SEGMENT_ATTR_FIELDS:
                 field_value = getattr(target_segment, field_name)
-            elif field_name in target_segment:
-                field_value = target_segment[field_name]
-            elif field_name.startswith('features.') and 'features' in target_segment:
-                # Handle nested features access like "features.spectral_entropy_mean"
-                feature_key = field_name.split('.', 1)[1]
-                features = target_segment.get('features', {})
-                if feature_key in features:
-                    field_value = features[feature_key]
-                else:
-                    self.osc_handler.send_error(f"feature not found: {feature_key}")
-                    return
             else:
-                self.osc_handler.send_error(f"field not found: {field_name}")
-                return
+                field_value = self.db_manager.get_segment_field(segment_id, field_name, _MISSING)
+                if field_value is _MISSING:
+                    if field_name.startswith('features.') and 'features' in target_segment:
+                        self.osc_handler.send_error(f"feature not found: {field_name.split('.', 1)[1]}")
+                    else:
+                        self.osc_handler.send_error(f"field not found: {field_name}")
+                    return
 
             # Send the result
             self.osc_handler.client.send_message(self.osc_handler.addresses['segment_field'], [
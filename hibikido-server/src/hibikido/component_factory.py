@@ -15,6 +15,7 @@ from .embedding_manager import EmbeddingManager
 from .text_processor import TextProcessor
 from .osc_handler import OSCHandler
 from .orchestrator import Orchestrator
+from .audio_loader import CACHE_SIZE, enable_fftw, set_audio_cache_size
 
 logger = logging.getLogger(__name__)
 
@@ -43,13 +44,21 @@ class ComponentFactory:
     
     def create_components(self) -> Tuple[HibikidoDatabase, EmbeddingManager, TextProcessor, OSCHandler, Orchestrator]:
         """Create all components."""
+        audio_config = self.config.get('audio', {})
+        set_audio_cache_size(audio_config.get('decode_cache_size', CACHE_SIZE))
+        if audio_config.get('use_fftw', False):
+            enable_fftw(threads=audio_config.get('fftw_threads', 1))
+        
         db_manager = HibikidoDatabase(
             data_dir=self.config['database']['data_dir']
         )
         
         embedding_manager = EmbeddingManager(
             model_name=self.config['embedding']['model_name'],
-            index_file=self.config['embedding']['index_file']
+            index_file=self.config['embedding']['index_file'],
+            flush_interval=self.config['embedding'].get('flush_interval', 2.0),
+            index_type=self.config['embedding'].get('index_type', 'flat'),
+            use_gpu=self.config['embedding'].get('use_gpu', True)
         )
         
         text_processor = TextProcessor()
@@ -58,11 +67,13 @@ class ComponentFactory:
             listen_ip=self.config['osc']['listen_ip'],
             listen_port=self.config['osc']['listen_port'],
             send_ip=self.config['osc']['send_ip'],
-            send_port=self.config['osc']['send_port']
+            send_port=self.config['osc']['send_port'],
+            niche_blob=self.config['osc'].get('niche_blob', False)
         )
         
         orchestrator = Orchestrator(
-            bark_similarity_threshold=self.config['orchestrator']['bark_similarity_threshold']
+            bark_similarity_threshold=self.config['orchestrator']['bark_similarity_threshold'],
+            max_queue_size=self.config['orchestrator'].get('max_queue_size')
         )
         
         return db_manager, embedding_manager, text_processor, osc_handler, orchestrator
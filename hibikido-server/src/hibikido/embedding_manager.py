@@ -7,25 +7,63 @@ FAISS indices stored in MongoDB documents as per original schema.
 """
 
 import os
+import threading
+from functools import lru_cache
 import faiss
+import numpy as np
 import torch
 from sentence_transformers import SentenceTransformer
+from sentence_transformers.util import batch_to_device
 import logging
 from typing import List, Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
+# HNSW graph settings for index_type "hnsw"
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Scalar quantizer settings for index_type "sq8": train on real embeddings once a
+# batch is large enough, widening the observed range so later vectors rarely clip
+SQ_MIN_TRAINING_VECTORS = 100
+SQ_RANGE_MARGIN = 0.1
+
+# Encoded queries kept for repeated invocations (~1.5 KB each at 384 dims)
+QUERY_CACHE_SIZE = 256
+
 class EmbeddingManager:
     """Simple embedding manager following original database design."""
     
     def __init__(self, model_name: str = "all-MiniLM-L6-v2", 
-                 index_file: str = "hibikido.index"):
+                 index_file: str = "hibikido.index",
+                 flush_interval: float = 2.0,
+                 index_type: str = "flat",
+                 use_gpu: bool = True):
         self.model_name = model_name
         self.index_file = index_file
+        self.index_type = index_type  # "flat" (exact), "hnsw" (approximate graph), "sq8" or "fp16" (compressed codes)
+        self.use_gpu = use_gpu  # Search a flat index on GPU when CUDA and faiss-gpu are present
+        self._gpu_resources = None
+        self._index_on_gpu = False
         self.model = None
+        self._encode_query = None
         self.index = None
         self.next_id = 0
         self.embedding_dim = 384  # all-MiniLM-L6-v2 dimension
+        
+        # Write-behind persistence: additions mark the index dirty and a
+        # background writer coalesces them into one save per flush_interval
+        self.flush_interval = flush_interval
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._dirty_event = threading.Event()
+        self._closed = threading.Event()
+        self._writer = None
+        
+        # Set when vectors without a database document are left in the index
+        # (see discard_embeddings); cleared by rebuild_from_database
+        self.needs_rebuild = False
     
     def initialize(self) -> bool:
         """Initialize the embedding model and FAISS index."""
@@ -33,6 +71,7 @@ class EmbeddingManager:
             return False
         if not self._load_or_create_index():
             return False
+        self._start_writer()
         return True
     
     def _load_model(self) -> bool:
@@ -42,6 +81,12 @@ class EmbeddingManager:
             logger.info(f"Loading embedding model: {self.model_name}")
             
             self.model = SentenceTransformer(self.model_name, device=device)
+            if device == "cuda":
+                # Half-precision weights and activations; embeddings are cast to
+                # float32 only where they enter FAISS
+                self.model.half()
+            # Fresh query cache per model so stale encodings never outlive a reload
+            self._encode_query = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._encode_query_uncached)
             logger.info(f"Embedding model loaded on: {device.upper()}")
             return True
             
@@ -49,29 +94,106 @@ class EmbeddingManager:
             logger.error(f"Failed to load embedding model: {e}")
             return False
     
+    def _encode_query_uncached(self, query: str):
+        """
+        Encode a stripped query to a (1, dim) normalized float32 row.
+        
+        Runs the model's module pipeline (transformer, pooling, ...) directly on
+        one tokenized text, skipping encode()'s batching and sorting bookkeeping.
+        """
+        features = batch_to_device(self.model.tokenize([query]), self.model.device)
+        with torch.inference_mode():
+            embedding = self.model(features)["sentence_embedding"]
+            embedding = torch.nn.functional.normalize(embedding, p=2, dim=1)
+        embedding = embedding.cpu().numpy().astype('float32')
+        embedding.setflags(write=False)  # Shared by every cache hit
+        return embedding
+    
     def _load_or_create_index(self) -> bool:
         """Load existing FAISS index or create a new one."""
         try:
             if os.path.exists(self.index_file):
                 self.index = faiss.read_index(self.index_file)
                 self.next_id = self.index.ntotal
+                if isinstance(self.index, faiss.IndexHNSW):
+                    self.index.hnsw.efSearch = HNSW_EF_SEARCH
+                expected = self._create_index()
+                if type(self.index) is not type(expected) or (
+                        isinstance(expected, faiss.IndexScalarQuantizer)
+                        and self.index.sq.qtype != expected.sq.qtype):
+                    logger.warning(f"FAISS index on disk does not match index_type '{self.index_type}' - "
+                                   f"run /rebuild_index to convert it")
                 logger.info(f"Loaded FAISS index with {self.index.ntotal} entries")
             else:
-                self.index = faiss.IndexFlatIP(self.embedding_dim)
+                self.index = self._create_index()
                 self.next_id = 0
                 self._save_index()
                 logger.info("Created new FAISS index")
             
+            self.index = self._to_device(self.index)
             return True
             
         except Exception as e:
             logger.error(f"Failed to initialize FAISS index: {e}")
             return False
     
+    def _create_index(self):
+        """Create an empty inner-product FAISS index of the configured type."""
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(self.embedding_dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+            return index
+        if self.index_type == "sq8":
+            # Untrained until the first add (see _train_index)
+            index = faiss.IndexScalarQuantizer(self.embedding_dim, faiss.ScalarQuantizer.QT_8bit,
+                                               faiss.METRIC_INNER_PRODUCT)
+            index.sq.rangestat_arg = SQ_RANGE_MARGIN
+            return index
+        if self.index_type == "fp16":
+            # Half-precision storage needs no training
+            return faiss.IndexScalarQuantizer(self.embedding_dim, faiss.ScalarQuantizer.QT_fp16,
+                                              faiss.METRIC_INNER_PRODUCT)
+        if self.index_type != "flat":
+            logger.warning(f"Unknown index_type '{self.index_type}', using flat index")
+        return faiss.IndexFlatIP(self.embedding_dim)
+    
+    def _train_index(self, embeddings: np.ndarray):
+        """Train a quantized index before its first add."""
+        if len(embeddings) >= SQ_MIN_TRAINING_VECTORS:
+            self.index.train(embeddings)
+            logger.info(f"Trained quantized FAISS index on {len(embeddings)} embeddings")
+        else:
+            # Too few samples for a stable range - normalized vectors lie in [-1, 1]
+            bounds = np.vstack([-np.ones(self.embedding_dim), np.ones(self.embedding_dim)]).astype('float32')
+            self.index.train(bounds)
+            logger.info("Trained quantized FAISS index on the unit range")
+    
+    def _to_device(self, index):
+        """Move a flat index to GPU when enabled and available, else return it unchanged."""
+        self._index_on_gpu = False
+        if not (self.use_gpu and isinstance(index, faiss.IndexFlat)
+                and hasattr(faiss, "StandardGpuResources") and torch.cuda.is_available()):
+            return index
+        try:
+            if self._gpu_resources is None:
+                self._gpu_resources = faiss.StandardGpuResources()
+            gpu_index = faiss.index_cpu_to_gpu(self._gpu_resources, 0, index)
+            self._index_on_gpu = True
+            logger.info("FAISS index moved to GPU")
+            return gpu_index
+        except Exception as e:
+            logger.warning(f"FAISS GPU unavailable, keeping index on CPU: {e}")
+            return index
+    
     def _save_index(self) -> bool:
-        """Save FAISS index to disk."""
+        """Save FAISS index to disk (via a temp file so a crash never leaves a torn index)."""
         try:
-            faiss.write_index(self.index, self.index_file)
+            tmp_file = self.index_file + ".tmp"
+            # GPU indexes cannot be serialized directly - snapshot a CPU copy
+            index = faiss.index_gpu_to_cpu(self.index) if self._index_on_gpu else self.index
+            faiss.write_index(index, tmp_file)
+            os.replace(tmp_file, self.index_file)
             logger.debug("FAISS index saved")
             return True
         except Exception as e:
@@ -80,7 +202,49 @@ class EmbeddingManager:
     
     def force_save_index(self) -> bool:
         """Explicitly save FAISS index to disk."""
-        return self._save_index()
+        with self._lock:
+            self._dirty = False
+            return self._save_index()
+    
+    def _mark_dirty(self):
+        """Schedule a background save of the index."""
+        with self._lock:
+            self._dirty = True
+        self._dirty_event.set()
+    
+    def _start_writer(self):
+        """Start the background thread that persists the index."""
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._flush_loop, name="faiss-writer", daemon=True)
+            self._writer.start()
+    
+    def _flush_loop(self):
+        """Wait for additions, let bursts settle for flush_interval, then save once."""
+        while not self._closed.is_set():
+            self._dirty_event.wait()
+            self._closed.wait(self.flush_interval)
+            self._dirty_event.clear()
+            self.flush()
+    
+    def flush(self) -> bool:
+        """Save the index now if it has unsaved additions."""
+        with self._lock:
+            if not self._dirty:
+                return True
+            self._dirty = False
+            if self._save_index():
+                return True
+            self._dirty = True
+            return False
+    
+    def close(self):
+        """Stop the background writer and save any pending additions."""
+        self._closed.set()
+        self._dirty_event.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        self.flush()
     
     def add_embedding(self, text: str) -> Optional[int]:
         """
@@ -92,30 +256,94 @@ class EmbeddingManager:
         Returns:
             FAISS index ID or None if failed
         """
-        try:
-            if not text or not text.strip():
-                logger.warning("Empty text provided for embedding")
-                return None
-            
-            # Create embedding
-            embedding = self.model.encode(text.strip(), normalize_embeddings=True)
-            embedding = embedding.reshape(1, -1)
-            
-            # Add to FAISS index
-            faiss_id = self.next_id
-            self.index.add(embedding)
-            self.next_id += 1
-            
-            # Save to disk
-            self._save_index()
-            
-            logger.debug(f"Added embedding {faiss_id}")
-            return faiss_id
-            
-        except Exception as e:
-            logger.error(f"Failed to add embedding: {e}")
+        if not text or not text.strip():
+            logger.warning("Empty text provided for embedding")
             return None
+        
+        # Single text is a batch of one - same encode, cast and index path
+        return self.add_embeddings([text])[0]
     
+    def add_embeddings(self, texts: List[str], save: bool = True,
+                       batch_size: int = 64) -> List[Optional[int]]:
+        """
+        Add several text embeddings to FAISS index with one batched encode.
+
+        Args:
+            texts: Texts to embed
+            save: Schedule a background save afterwards (callers batching several calls save once)
+            batch_size: Texts per model forward pass
+
+        Returns:
+            FAISS index IDs aligned with texts (None for empty texts or on failure)
+        """
+        faiss_ids: List[Optional[int]] = [None] * len(texts)
+        try:
+            positions = [i for i, text in enumerate(texts) if text and text.strip()]
+            if not positions:
+                if texts:
+                    logger.warning("No non-empty texts provided for embedding")
+                return faiss_ids
+
+            # Create all embeddings in one pass through the model
+            embeddings = self.model.encode(
+                [texts[i].strip() for i in positions],
+                batch_size=batch_size,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            ).astype('float32', copy=False)  # float16 from a CUDA model; FAISS takes float32
+
+            # Add to FAISS index in one call
+            with self._lock:
+                if not self.index.is_trained:
+                    self._train_index(embeddings)
+                first_id = self.next_id
+                self.index.add(embeddings)
+                self.next_id += len(positions)
+
+            # Save to disk in the background, once for the whole batch
+            if save:
+                self._mark_dirty()
+
+            for offset, i in enumerate(positions):
+                faiss_ids[i] = first_id + offset
+
+            logger.debug(f"Added {len(positions)} embeddings from {first_id}")
+            return faiss_ids
+
+        except Exception as e:
+            logger.error(f"Failed to add embeddings: {e}")
+            return [None] * len(texts)
+
+    def discard_embeddings(self, faiss_ids: List[Optional[int]]) -> bool:
+        """
+        Remove just-added embeddings whose documents could not be stored.
+
+        Only the newest ids can go (earlier ids must not shift), and HNSW or GPU
+        indexes cannot remove vectors at all; otherwise the ids stay orphaned -
+        searches skip them - and needs_rebuild is set.
+
+        Returns:
+            True if the embeddings were removed
+        """
+        ids = sorted(faiss_id for faiss_id in faiss_ids if faiss_id is not None)
+        if not ids:
+            return True
+        first, last = ids[0], ids[-1]
+        with self._lock:
+            if ids == list(range(first, last + 1)) and last + 1 == self.next_id:
+                try:
+                    if self.index.remove_ids(faiss.IDSelectorRange(first, last + 1)) == len(ids):
+                        self.next_id = first
+                        self._mark_dirty()
+                        logger.info(f"Discarded FAISS embeddings {first}-{last}")
+                        return True
+                except RuntimeError:
+                    pass  # Index type without remove_ids
+            self.needs_rebuild = True
+        logger.warning(f"FAISS embeddings {first}-{last} have no documents - run /rebuild_index")
+        return False
+
     def search(self, query: str, top_k: int = 10, db_manager=None) -> List[Dict[str, Any]]:
         """
         Search FAISS index and return MongoDB documents (updated for path-based schema).
@@ -129,7 +357,9 @@ class EmbeddingManager:
             List of {"collection": str, "document": dict, "score": float} dicts
         """
         try:
-            if not query or not query.strip():
+            # Cheap guards first: nothing here needs the encoder or FAISS
+            query = query.strip() if query else ""
+            if not query or top_k <= 0:
                 return []
             
             if self.index.ntotal == 0:
@@ -140,37 +370,28 @@ class EmbeddingManager:
                 logger.error("Database manager required for search")
                 return []
             
-            # Create query embedding
-            query_embedding = self.model.encode(query.strip(), normalize_embeddings=True)
-            query_embedding = query_embedding.reshape(1, -1)
+            # Create query embedding (repeated incantations hit the LRU cache)
+            query_embedding = self._encode_query(query)
             
             # Search FAISS
             k = min(top_k, self.index.ntotal)
             scores, indices = self.index.search(query_embedding, k)
             
-            # MongoDB lookups by FAISS_index (updated for separate presets collection)
+            # tolist() yields native ints/floats in one call (no per-element numpy coercion)
+            hit_ids = indices[0].tolist()
+            hit_scores = scores[0].tolist()
+            
+            # Resolve all hits with one lookup per collection (segments first, then presets)
+            documents = db_manager.get_by_faiss_ids([i for i in hit_ids if i >= 0])
+            
             results = []
-            for faiss_idx, score in zip(indices[0], scores[0]):
-                # Convert numpy.int64 to regular Python int for MongoDB
-                faiss_idx = int(faiss_idx)
-                
-                # Look for segment with this FAISS_index (TinyDB version)
-                segment = db_manager.get_segment_by_faiss_id(faiss_idx)
-                if segment:
+            for faiss_idx, score in zip(hit_ids, hit_scores):
+                hit = documents.get(faiss_idx)
+                if hit:
                     results.append({
-                        "collection": "segments",
-                        "document": segment,
-                        "score": float(score)
-                    })
-                    continue
-                
-                # Look for preset with this FAISS_index (TinyDB version)
-                preset = db_manager.get_preset_by_faiss_id(faiss_idx)
-                if preset:
-                    results.append({
-                        "collection": "presets", 
-                        "document": preset,
-                        "score": float(score)
+                        "collection": hit[0],
+                        "document": hit[1],
+                        "score": score
                     })
             
             logger.info(f"Search '{query}' returned {len(results)} results")
@@ -184,6 +405,14 @@ class EmbeddingManager:
         """Get total number of embeddings."""
         return self.index.ntotal if self.index else 0
     
+    @staticmethod
+    def _index_by(documents: List[Dict[str, Any]], key: str) -> Dict[Any, Dict[str, Any]]:
+        """Map key value -> first document with that value (same pick as a TinyDB search)."""
+        indexed = {}
+        for document in documents:
+            indexed.setdefault(document.get(key), document)
+        return indexed
+    
     def rebuild_from_database(self, db_manager, text_processor=None) -> Dict[str, int]:
         """
         Rebuild entire FAISS index from MongoDB (updated for path-based schema).
@@ -207,98 +436,84 @@ class EmbeddingManager:
         
         try:
             # Reset index
-            self.index = faiss.IndexFlatIP(self.embedding_dim)
-            self.next_id = 0
+            with self._lock:
+                self.index = self._to_device(self._create_index())
+                self.next_id = 0
+                self.needs_rebuild = False
             
-            # Process segments with hierarchical context
+            # Preload parent documents once so each context lookup is a dict hit
+            # instead of a TinyDB scan per segment/preset
             if text_processor:
-                segments = db_manager.segments_db.all()
-                for segment in segments:
+                recordings = self._index_by(db_manager.recordings_db.all(), "path")
+                segmentations = self._index_by(db_manager.segmentations_db.all(), "segmentation_id")
+                effects = self._index_by(db_manager.effects_db.all(), "path")
+            
+            # Stream segments a page at a time: collect texts, encode them in one
+            # batch, then write FAISS_index back in one update per page
+            for page in db_manager.iter_segments():
+                segment_ids = []
+                segment_texts = []
+                for segment in page:
                     try:
                         stats["segments_processed"] += 1
                         
-                        # Get context for hierarchical embedding (path-based lookup)
-                        recording = db_manager.get_recording_by_path(segment.get("source_path"))
-                        segmentation = db_manager.get_segmentation(segment.get("segmentation_id"))
-                        
-                        # Create hierarchical embedding text
-                        embedding_text = text_processor.create_segment_embedding_text(
-                            segment, recording, segmentation
-                        )
+                        if text_processor:
+                            # Get context for hierarchical embedding (path-based lookup)
+                            recording = recordings.get(segment.get("source_path"))
+                            segmentation = segmentations.get(segment.get("segmentation_id"))
+                            
+                            # Create hierarchical embedding text
+                            embedding_text = text_processor.create_segment_embedding_text(
+                                segment, recording, segmentation
+                            )
+                        else:
+                            # Fallback to existing embedding_text
+                            embedding_text = segment.get("embedding_text", "")
                         
                         if embedding_text:
-                            faiss_id = self.add_embedding(embedding_text)
-                            
-                            if faiss_id is not None:
-                                # Update segment with new FAISS_index and embedding_text (TinyDB version)
-                                from tinydb import Query
-                                Q = Query()
-                                db_manager.segments_db.update(
-                                    {"FAISS_index": faiss_id, "embedding_text": embedding_text},
-                                    doc_ids=[segment.doc_id]
-                                )
-                                stats["segments_added"] += 1
+                            segment_ids.append(segment.doc_id)
+                            segment_texts.append(embedding_text)
                     
                     except Exception as e:
                         stats["errors"] += 1
                         logger.error(f"Failed to process segment {segment.get('source_path', 'unknown')}: {e}")
+                
+                stats["segments_added"] += self._index_page(
+                    db_manager.update_segments, segment_ids, segment_texts, bool(text_processor)
+                )
             
-            else:
-                # Fallback to existing embedding_text
-                segments = db_manager.segments_db.all()
-                for segment in segments:
+            # Process presets with hierarchical context (now separate collection)
+            for page in db_manager.iter_presets():
+                preset_ids = []
+                preset_texts = []
+                for preset in page:
                     try:
-                        stats["segments_processed"] += 1
+                        stats["presets_processed"] += 1
                         
-                        embedding_text = segment.get("embedding_text", "")
-                        if embedding_text:
-                            faiss_id = self.add_embedding(embedding_text)
+                        if text_processor:
+                            # Get effect context (path-based lookup)
+                            effect = effects.get(preset.get("effect_path"))
                             
-                            if faiss_id is not None:
-                                db_manager.segments_db.update(
-                                    {"FAISS_index": faiss_id},
-                                    doc_ids=[segment.doc_id]
-                                )
-                                stats["segments_added"] += 1
+                            # Create hierarchical embedding text
+                            embedding_text = text_processor.create_preset_embedding_text(preset, effect)
+                        else:
+                            # Fallback to existing embedding_text
+                            embedding_text = preset.get("embedding_text", "")
+                        
+                        if embedding_text:
+                            preset_ids.append(preset.doc_id)
+                            preset_texts.append(embedding_text)
                     
                     except Exception as e:
                         stats["errors"] += 1
-                        logger.error(f"Failed to process segment {segment.get('source_path', 'unknown')}: {e}")
-            
-            # Process presets with hierarchical context (now separate collection)
-            presets = db_manager.presets_db.all()
-            for preset in presets:
-                try:
-                    stats["presets_processed"] += 1
-                    
-                    if text_processor:
-                        # Get effect context (path-based lookup)
-                        effect = db_manager.get_effect_by_path(preset.get("effect_path"))
-                        
-                        # Create hierarchical embedding text
-                        embedding_text = text_processor.create_preset_embedding_text(preset, effect)
-                    else:
-                        # Fallback to existing embedding_text
-                        embedding_text = preset.get("embedding_text", "")
-                    
-                    if embedding_text:
-                        faiss_id = self.add_embedding(embedding_text)
-                        
-                        if faiss_id is not None:
-                            # Update preset with new FAISS_index and embedding_text
-                            update_data = {"FAISS_index": faiss_id}
-                            if text_processor:
-                                update_data["embedding_text"] = embedding_text
-                            
-                            db_manager.presets_db.update(
-                                update_data,
-                                doc_ids=[preset.doc_id]
-                            )
-                            stats["presets_added"] += 1
+                        logger.error(f"Failed to process preset {preset.get('effect_path', 'unknown')}: {e}")
                 
-                except Exception as e:
-                    stats["errors"] += 1
-                    logger.error(f"Failed to process preset {preset.get('effect_path', 'unknown')}: {e}")
+                stats["presets_added"] += self._index_page(
+                    db_manager.update_presets, preset_ids, preset_texts, bool(text_processor)
+                )
+            
+            # Single write of the rebuilt index
+            self.force_save_index()
             
             logger.info(f"Index rebuild complete: {stats}")
             return stats
@@ -307,5 +522,17 @@ class EmbeddingManager:
             logger.error(f"Index rebuild failed: {e}")
             stats["errors"] += 1
             return stats
+    
+    def _index_page(self, update, doc_ids: List[int], texts: List[str], store_text: bool) -> int:
+        """Embed one page of documents and write their FAISS_index back with `update`."""
+        updates = {}
+        faiss_ids = self.add_embeddings(texts, save=False)
+        for doc_id, embedding_text, faiss_id in zip(doc_ids, texts, faiss_ids):
+            if faiss_id is not None:
+                update_data = {"FAISS_index": faiss_id}
+                if store_text:
+                    update_data["embedding_text"] = embedding_text
+                updates[doc_id] = update_data
+        return update(updates) if updates else 0
 
     
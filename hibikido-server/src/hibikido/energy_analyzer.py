@@ -4,17 +4,58 @@ Hibikidō Energy Model analyzer - starts with onset detection.
 Simple onset counting as foundation for more complex energy analysis.
 """
 
+import os
+import threading
 import numpy as np
 import librosa
-from typing import Dict, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 import logging
+from .audio_loader import load_audio
 
 logger = logging.getLogger(__name__)
 
+# One analyzer per pool worker, created by _init_worker
+_worker_analyzer: Optional['EnergyAnalyzer'] = None
+
+# Threads computing band envelopes concurrently (mel projection and onset
+# strength spend their time in NumPy, outside the GIL); created on first use
+_band_pool: Optional[ThreadPoolExecutor] = None
+_band_pool_lock = threading.Lock()
+
+
+def _get_band_pool() -> ThreadPoolExecutor:
+    """Shared thread pool for per-band envelopes, one thread per band."""
+    global _band_pool
+    with _band_pool_lock:
+        if _band_pool is None:
+            _band_pool = ThreadPoolExecutor(max_workers=len(EnergyAnalyzer.BANDS),
+                                            thread_name_prefix="onset-band")
+        return _band_pool
+
+
+def _reset_band_pool():
+    """Forked processes (analyze_energy_batch workers) must not reuse the parent's threads."""
+    global _band_pool, _band_pool_lock
+    _band_pool = None
+    _band_pool_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_band_pool)
+
 
 class EnergyAnalyzer:
     """Analyzes audio files for energy model features, starting with onset detection."""
     
+    # The 3 frequency bands
+    BANDS = {
+        'low_mid': {'fmin': 150, 'fmax': 2000},      # Low-mid (150-2000 Hz)
+        'mid': {'fmin': 500, 'fmax': 4000},          # Mid (500-4000 Hz) 
+        'high_mid': {'fmin': 2000, 'fmax': 8000}     # High-mid (2000-8000 Hz)
+    }
+    HOP_LENGTH = 512  # librosa default, needed to map envelope frames to time
+    
     def __init__(self, sample_rate: int = 44100):  # Common default, but dynamically set
         """
         Initialize energy analyzer.
@@ -24,6 +65,22 @@ class EnergyAnalyzer:
         """
         self.sample_rate = sample_rate
         
+    def analyze_onsets(self, audio_path: str, start_time: float = 0.0,
+                       end_time: Optional[float] = None) -> Dict[str, any]:
+        """
+        Load an audio file (shared decode cache) and analyze its onsets.
+        
+        Args:
+            audio_path: Path to audio file
+            start_time: Start time in seconds
+            end_time: End time in seconds (None = full file)
+            
+        Returns:
+            Same dictionary as analyze_energy_data()
+        """
+        y, sr = load_audio(audio_path)  # Preserve original sample rate
+        return self.analyze_energy_data(y, sr, start_time, end_time)
+        
     def analyze_energy_data(self, y: np.ndarray, sr: int, start_time: float = 0.0, 
                            end_time: Optional[float] = None) -> Dict[str, any]:
         """
@@ -52,44 +109,17 @@ class EnergyAnalyzer:
             if len(y_segment) == 0:
                 raise ValueError(f"Invalid time segment: {start_time}s to {end_time}s")
             
-            # Define the 3 frequency bands
-            bands = {
-                'low_mid': {'fmin': 150, 'fmax': 2000},      # Low-mid (150-2000 Hz)
-                'mid': {'fmin': 500, 'fmax': 4000},          # Mid (500-4000 Hz) 
-                'high_mid': {'fmin': 2000, 'fmax': 8000}     # High-mid (2000-8000 Hz)
-            }
-            
             onset_times = {}
             total_onsets = 0
             
             # Analyze each frequency band
-            for band_name, freq_range in bands.items():
-                # Compute onset strength for this frequency band
-                band_onset_strength = librosa.onset.onset_strength(
-                    y=y_segment,
-                    sr=sr,
-                    fmin=freq_range['fmin'],
-                    fmax=freq_range['fmax']
-                )
-                
-                # Calculate IQR-based adaptive delta for this band
-                q75, q25 = np.percentile(band_onset_strength, [75, 25])
-                band_delta = float((q75 - q25) * 0.5)
-                
-                # Detect onsets in this band
-                band_onset_frames = librosa.onset.onset_detect(
-                    onset_envelope=band_onset_strength,
-                    sr=sr,
-                    units='frames',
-                    delta=band_delta
-                )
+            for band_name, band_onset_strength in self.band_onset_envelopes(y_segment, sr).items():
+                band_onset_frames, _ = self.detect_band_onsets(band_onset_strength, sr, band_name)
                 
                 # Convert frames to times (relative to segment start)
-                band_onset_times = librosa.frames_to_time(band_onset_frames, sr=sr)
+                band_onset_times = librosa.frames_to_time(band_onset_frames, sr=sr, hop_length=self.HOP_LENGTH)
                 onset_times[f'onset_times_{band_name}'] = band_onset_times.tolist()
                 total_onsets += len(band_onset_frames)
-                
-                logger.debug(f"{band_name} band: {len(band_onset_frames)} onsets, delta={band_delta:.3f}")
             
             logger.debug(f"Energy analysis: {duration:.2f}s, {total_onsets} total onsets across 3 bands")
             
@@ -102,13 +132,151 @@ class EnergyAnalyzer:
             
         except Exception as e:
             logger.error(f"Energy analysis failed: {e}")
-            # Return safe defaults on failure
+            return self._empty_result()
+    
+    def precompute_onset_envelopes(self, y: np.ndarray, sr: int) -> Dict[str, np.ndarray]:
+        """
+        Compute each band's onset strength envelope once for a whole recording.
+        
+        Callers analyzing many segments of the same file pass the result to
+        analyze_energy_from_envelopes() instead of recomputing the STFT per segment.
+        
+        Args:
+            y: Audio signal array (full recording)
+            sr: Sample rate
+            
+        Returns:
+            Dictionary of band name -> onset strength envelope
+        """
+        return self.band_onset_envelopes(y, sr)
+    
+    def band_onset_envelopes(self, y: np.ndarray, sr: int,
+                             power: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Onset strength per band from a single power STFT.
+        
+        Each band keeps its own mel filterbank over fmin-fmax, so the envelopes
+        match onset_strength(y=..., fmin=..., fmax=...) without one STFT per band.
+        
+        Args:
+            y: Audio signal array
+            sr: Sample rate
+            power: |stft(y, hop_length=HOP_LENGTH)|**2 if the caller already has it
+            
+        Returns:
+            Dictionary of band name -> onset strength envelope
+        """
+        if power is None:
+            power = np.abs(librosa.stft(y, hop_length=self.HOP_LENGTH)) ** 2
+        
+        def band_envelope(freq_range: Dict[str, int]) -> np.ndarray:
+            return librosa.onset.onset_strength(
+                S=librosa.power_to_db(librosa.feature.melspectrogram(
+                    S=power,
+                    sr=sr,
+                    fmin=freq_range['fmin'],
+                    fmax=freq_range['fmax']
+                )),
+                sr=sr,
+                hop_length=self.HOP_LENGTH
+            )
+        
+        pool = _get_band_pool()
+        futures = {band_name: pool.submit(band_envelope, freq_range)
+                   for band_name, freq_range in self.BANDS.items()}
+        return {band_name: future.result() for band_name, future in futures.items()}
+    
+    def analyze_energy_from_envelopes(self, envelopes: Dict[str, np.ndarray], sr: int,
+                                      start_time: float, end_time: float) -> Dict[str, any]:
+        """
+        Analyze onset times for a segment by slicing precomputed band envelopes.
+        
+        Onset times are snapped to the recording's frame grid, so they can differ
+        from analyze_energy_data() on the segment alone by less than one hop.
+        
+        Args:
+            envelopes: Output of precompute_onset_envelopes() for the recording
+            sr: Sample rate
+            start_time: Start time in seconds
+            end_time: End time in seconds
+            
+        Returns:
+            Same dictionary as analyze_energy_data()
+        """
+        try:
+            start_sample = int(start_time * sr)
+            end_sample = int(end_time * sr)
+            if end_sample <= start_sample:
+                raise ValueError(f"Invalid time segment: {start_time}s to {end_time}s")
+            
+            # Frame range covering the segment (same frame count as a per-segment envelope)
+            start_frame = start_sample // self.HOP_LENGTH
+            end_frame = start_frame + 1 + (end_sample - start_sample) // self.HOP_LENGTH
+            
+            onset_times = {}
+            total_onsets = 0
+            
+            for band_name in self.BANDS:
+                band_onset_strength = envelopes[band_name][start_frame:end_frame]
+                if len(band_onset_strength) == 0:
+                    raise ValueError(f"Invalid time segment: {start_time}s to {end_time}s")
+                
+                band_onset_frames, _ = self.detect_band_onsets(band_onset_strength, sr, band_name)
+                
+                # Convert recording frames to times relative to segment start
+                band_onset_times = librosa.frames_to_time(
+                    band_onset_frames + start_frame, sr=sr, hop_length=self.HOP_LENGTH
+                ) - start_time
+                onset_times[f'onset_times_{band_name}'] = np.maximum(band_onset_times, 0.0).tolist()
+                total_onsets += len(band_onset_frames)
+            
+            duration = (end_sample - start_sample) / sr
+            logger.debug(f"Energy analysis (precomputed): {duration:.2f}s, {total_onsets} total onsets across 3 bands")
+            
             return {
-                'onset_times_low_mid': [],
-                'onset_times_mid': [],
-                'onset_times_high_mid': [],
-                'duration': 0.0
+                'onset_times_low_mid': onset_times['onset_times_low_mid'],
+                'onset_times_mid': onset_times['onset_times_mid'], 
+                'onset_times_high_mid': onset_times['onset_times_high_mid'],
+                'duration': duration
             }
+            
+        except Exception as e:
+            logger.error(f"Energy analysis failed: {e}")
+            return self._empty_result()
+    
+    def detect_band_onsets(self, band_onset_strength: np.ndarray, sr: int,
+                           band_name: str) -> Tuple[np.ndarray, float]:
+        """
+        Detect onset frames in one band envelope with an IQR-based adaptive delta.
+        
+        Returns:
+            (onset frames, delta used for peak picking)
+        """
+        # Calculate IQR-based adaptive delta for this band
+        q75, q25 = np.percentile(band_onset_strength, [75, 25])
+        band_delta = float((q75 - q25) * 0.5)
+        
+        # Detect onsets in this band
+        band_onset_frames = librosa.onset.onset_detect(
+            onset_envelope=band_onset_strength,
+            sr=sr,
+            hop_length=self.HOP_LENGTH,
+            units='frames',
+            delta=band_delta
+        )
+        
+        logger.debug(f"{band_name} band: {len(band_onset_frames)} onsets, delta={band_delta:.3f}")
+        return band_onset_frames, band_delta
+    
+    @staticmethod
+    def _empty_result() -> Dict[str, any]:
+        """Safe defaults returned when analysis fails."""
+        return {
+            'onset_times_low_mid': [],
+            'onset_times_mid': [],
+            'onset_times_high_mid': [],
+            'duration': 0.0
+        }
 
 
 def analyze_energy_features(y: np.ndarray, sr: int, start_time: float = 0.0, 
@@ -126,4 +294,63 @@ def analyze_energy_features(y: np.ndarray, sr: int, start_time: float = 0.0,
         Dictionary with energy analysis results
     """
     analyzer = EnergyAnalyzer(sr)
-    return analyzer.analyze_energy_data(y, sr, start_time, end_time)
\ No newline at end of file
+    return analyzer.analyze_energy_data(y, sr, start_time, end_time)
+
+
+def precompute_onset_envelopes(y: np.ndarray, sr: int) -> Dict[str, np.ndarray]:
+    """
+    Convenience function to compute band onset envelopes for a whole recording.
+    
+    Args:
+        y: Audio signal array
+        sr: Sample rate
+        
+    Returns:
+        Dictionary of band name -> onset strength envelope
+    """
+    return EnergyAnalyzer(sr).precompute_onset_envelopes(y, sr)
+
+
+def analyze_energy_batch(jobs: List[Tuple[str, float, Optional[float]]],
+                         workers: Optional[int] = None) -> List[Dict[str, any]]:
+    """
+    Analyze many (audio_path, start_time, end_time) segments across a process pool.
+    
+    Jobs are dispatched grouped by file so each worker mostly reuses its own
+    decoded audio (see load_audio); results come back in the order of jobs.
+    
+    Args:
+        jobs: (audio_path, start_time, end_time) tuples, end_time None = end of file
+        workers: Number of worker processes (None = os.cpu_count())
+        
+    Returns:
+        One analyze_onsets() result dictionary per job
+    """
+    if not jobs:
+        return []
+    
+    workers = workers or os.cpu_count() or 1
+    order = sorted(range(len(jobs)), key=lambda i: jobs[i][0])
+    chunksize = max(1, len(jobs) // (workers * 4))
+    
+    results: List[Optional[Dict[str, any]]] = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for i, result in zip(order, pool.map(_analyze_job, [jobs[i] for i in order], chunksize=chunksize)):
+            results[i] = result
+    return results
+
+
+def _init_worker():
+    """Create the per-process analyzer used by _analyze_job."""
+    global _worker_analyzer
+    _worker_analyzer = EnergyAnalyzer()
+
+
+def _analyze_job(job: Tuple[str, float, Optional[float]]) -> Dict[str, any]:
+    """Run one batch job in a worker process."""
+    audio_path, start_time, end_time = job
+    try:
+        return _worker_analyzer.analyze_onsets(audio_path, start_time, end_time)
+    except Exception as e:
+        logger.error(f"Energy analysis failed for {audio_path}: {e}")
+        return EnergyAnalyzer._empty_result()
@@ -3,26 +3,145 @@ Comprehensive audio feature extraction for Hibikidō.
 Extracts detailed spectral, temporal, and perceptual features from audio.
 """
 
+import os
+import hashlib
+import shelve
+import threading
 import numpy as np
 import librosa
+from numba import njit
+from scipy.ndimage import uniform_filter1d
 from pathlib import Path
 from typing import Dict, Optional
 import logging
+from .audio_loader import load_audio
 
 logger = logging.getLogger(__name__)
 
+# Suggested location for the optional persistent feature cache
+DEFAULT_FEATURE_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "hibikido", "features.db")
+
+# Bump whenever the feature definitions change so stale cached dicts are ignored
+FEATURE_CACHE_VERSION = 1
+
+# Leading bytes hashed to fingerprint a file (with its size and mtime)
+FINGERPRINT_BYTES = 1 << 20
+
+# shelve is not safe for concurrent access
+_feature_cache_lock = threading.Lock()
+
+
+@njit(cache=True)
+def _envelope_points(envelope):
+    """
+    Find the attack/decay landmarks of a smoothed envelope in one walk.
+    
+    Returns:
+        (peak_idx, attack_start, attack_end, decay_point) - the first sample
+        above 10% and 90% of the peak, and the offset after the peak of the
+        first sample below 50%; each is 0 when no sample qualifies, like
+        np.argmax over the equivalent boolean mask
+    """
+    n = envelope.shape[0]
+    peak_idx = 0
+    peak_val = envelope[0]
+    for i in range(1, n):
+        if envelope[i] > peak_val:
+            peak_val = envelope[i]
+            peak_idx = i
+    
+    # Both attack thresholds are crossed by the peak at the latest
+    attack_start = 0
+    attack_end = 0
+    start_found = False
+    for i in range(peak_idx + 1):
+        if not start_found and envelope[i] > 0.1 * peak_val:
+            attack_start = i
+            start_found = True
+        if envelope[i] > 0.9 * peak_val:
+            attack_end = i
+            break
+    
+    decay_point = 0
+    for i in range(peak_idx, n):
+        if envelope[i] < 0.5 * peak_val:
+            decay_point = i - peak_idx
+            break
+    
+    return peak_idx, attack_start, attack_end, decay_point
+
+
+@njit(cache=True)
+def _spectral_frame_stats(magnitude):
+    """
+    Per-frame statistics of a magnitude spectrogram, one frame at a time.
+    
+    librosa's STFT is column-major, so each frame is contiguous and stays in
+    cache while its sums and then its entropy are accumulated.
+    
+    Returns:
+        (bin_sums, irregularity, flux, entropy, voiced) - magnitude summed over
+        frames per bin; per frame, the absolute differences between adjacent
+        bins relative to the frame sum, the squared difference with the
+        previous frame (from the second frame on) and the Shannon entropy in
+        bits of the normalised spectrum; voiced marks frames with a positive sum
+    """
+    n_bins, n_frames = magnitude.shape
+    bin_sums = np.zeros(n_bins)
+    irregularity = np.zeros(n_frames)
+    flux = np.zeros(max(n_frames - 1, 0))
+    entropy = np.zeros(n_frames)
+    voiced = np.zeros(n_frames, dtype=np.bool_)
+    for t in range(n_frames):
+        frame_sum = 0.0
+        abs_diff = 0.0
+        for f in range(n_bins):
+            value = magnitude[f, t]
+            frame_sum += value
+            bin_sums[f] += value
+            if f > 0:
+                abs_diff += abs(value - magnitude[f - 1, t])
+            if t > 0:
+                delta = value - magnitude[f, t - 1]
+                flux[t - 1] += delta * delta
+        irregularity[t] = abs_diff / (frame_sum + 1e-8)
+        
+        # Zero bins add nothing to the entropy
+        if frame_sum > 0:
+            voiced[t] = True
+            frame_entropy = 0.0
+            for f in range(n_bins):
+                prob = magnitude[f, t] / frame_sum
+                frame_entropy -= prob * np.log2(prob + 1e-8)
+            entropy[t] = frame_entropy
+    return bin_sums, irregularity, flux, entropy, voiced
+
 
 class AudioFeatureExtractor:
     """Extracts comprehensive audio features for semantic analysis and storage."""
     
-    def __init__(self, sample_rate: int = 44100):  # Common default, but dynamically set
+    # STFT geometry (librosa defaults); stored features are only comparable
+    # between segments analyzed with the same values
+    N_FFT = 2048
+    HOP_LENGTH = 512
+    
+    def __init__(self, sample_rate: int = 44100,  # Common default, but dynamically set
+                 n_fft: int = N_FFT, hop_length: int = HOP_LENGTH,
+                 cache_file: Optional[str] = None):
         """
         Initialize feature extractor.
         
         Args:
             sample_rate: Target sample rate for analysis
+            n_fft: FFT size of the shared STFT (1024 halves FFT work at coarser frequency resolution)
+            hop_length: Samples between STFT frames
+            cache_file: shelve file persisting extract_features() results across
+                runs (e.g. DEFAULT_FEATURE_CACHE); None disables the cache
         """
         self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.cache_file = cache_file
         
     def extract_features(self, audio_path: str, start_time: float = 0.0, 
                         end_time: Optional[float] = None) -> Optional[Dict]:
@@ -38,8 +157,15 @@ class AudioFeatureExtractor:
             Dictionary with comprehensive features or None if analysis fails
         """
         try:
-            # Load audio
-            y, sr = librosa.load(audio_path, sr=None)  # Preserve original sample rate
+            cache_key = None
+            if self.cache_file:
+                cache_key = self._cache_key(audio_path, start_time, end_time)
+                features = self._cache_get(cache_key)
+                if features is not None:
+                    return features
+            
+            # Load audio (shared decode cache, keyed on path and mtime)
+            y, sr = load_audio(audio_path)  # Preserve original sample rate
             
             # Handle time segment
             if end_time is not None:
@@ -47,12 +173,42 @@ class AudioFeatureExtractor:
                 end_sample = int(end_time * sr)
                 y = y[start_sample:end_sample]
             
-            return self.extract_features_from_audio(y, sr)
+            features = self.extract_features_from_audio(y, sr)
+            if cache_key is not None:
+                self._cache_put(cache_key, features)
+            return features
             
         except Exception as e:
             logger.error(f"Failed to extract features from {audio_path}: {e}")
             return None
     
+    def _cache_key(self, audio_path: str, start_time: float, end_time: Optional[float]) -> str:
+        """Key on file content (leading-bytes hash, size, mtime), segment and STFT settings."""
+        stat = os.stat(audio_path)
+        digest = hashlib.blake2b(digest_size=16)
+        with open(audio_path, 'rb') as f:
+            digest.update(f.read(FINGERPRINT_BYTES))
+        return (f"{FEATURE_CACHE_VERSION}|{digest.hexdigest()}|{stat.st_size}|{stat.st_mtime_ns}|"
+                f"{start_time}|{end_time}|{self.n_fft}|{self.hop_length}")
+    
+    def _cache_get(self, key: str) -> Optional[Dict]:
+        """Cached features for key, or None (a broken cache only costs a recompute)."""
+        try:
+            with _feature_cache_lock, shelve.open(self.cache_file, flag='r') as cache:
+                return cache.get(key)
+        except Exception as e:
+            logger.debug(f"Feature cache miss for {key}: {e}")
+            return None
+    
+    def _cache_put(self, key: str, features: Dict):
+        """Persist features under key."""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+            with _feature_cache_lock, shelve.open(self.cache_file) as cache:
+                cache[key] = features
+        except Exception as e:
+            logger.warning(f"Failed to write feature cache {self.cache_file}: {e}")
+    
     def extract_features_from_audio(self, y: np.ndarray, sr: int) -> Dict:
         """
         Extract comprehensive features from loaded audio data.
@@ -64,73 +220,97 @@ class AudioFeatureExtractor:
         Returns:
             Dictionary with all extracted features
         """
+        # Keep the whole pipeline in float32 (complex64 STFT); callers may pass float64
+        y = np.asarray(y, dtype=np.float32)
         duration = librosa.get_duration(y=y, sr=sr)
+        n_fft = self.n_fft
+        hop_length = self.hop_length
+        
+        # One STFT shared by every spectral feature below (each librosa feature
+        # would otherwise recompute the same STFT from y); features given S infer
+        # n_fft from its shape
+        stft = librosa.stft(y, n_fft=n_fft, hop_length=hop_length)
+        magnitude = np.abs(stft)
+        power = magnitude ** 2
         
         # Basic properties
-        rms = librosa.feature.rms(y=y)[0]
+        rms = librosa.feature.rms(y=y, frame_length=n_fft, hop_length=hop_length)[0]
         rms_mean = float(np.mean(rms))
         rms_std = float(np.std(rms))
         
         # Spectral features
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
-        spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr)[0]
-        zero_crossing_rate = librosa.feature.zero_crossing_rate(y)[0]
+        spectral_centroids = librosa.feature.spectral_centroid(S=magnitude, sr=sr)[0]
+        spectral_rolloff = librosa.feature.spectral_rolloff(S=magnitude, sr=sr)[0]
+        spectral_bandwidth = librosa.feature.spectral_bandwidth(S=magnitude, sr=sr)[0]
+        zero_crossing_rate = librosa.feature.zero_crossing_rate(y, frame_length=n_fft, hop_length=hop_length)[0]
+        
+        # Log-mel spectrogram shared by MFCCs, the beat tracker and the onset
+        # detector (identical to what each would compute internally from y)
+        mel_db = librosa.power_to_db(librosa.feature.melspectrogram(S=power, sr=sr))
         
         # MFCCs (first 13 coefficients)
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-        mfcc_means = [float(np.mean(mfcc)) for mfcc in mfccs]
+        mfccs = librosa.feature.mfcc(S=mel_db, n_mfcc=13)
+        mfcc_means = mfccs.mean(axis=1).tolist()
         
         # Chroma features
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-        chroma_mean = [float(np.mean(c)) for c in chroma]
+        chroma = librosa.feature.chroma_stft(S=power, sr=sr)
+        chroma_mean = chroma.mean(axis=1).tolist()
         
-        # Tempo and rhythm
-        tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
+        # Tempo and rhythm (beat_track's default envelope uses median aggregation)
+        beat_envelope = librosa.onset.onset_strength(S=mel_db, sr=sr, n_fft=n_fft, hop_length=hop_length,
+                                                     aggregate=np.median)
+        tempo, beats = librosa.beat.beat_track(onset_envelope=beat_envelope, sr=sr, hop_length=hop_length)
         
         # Onset detection
-        onsets = librosa.onset.onset_detect(y=y, sr=sr, units='time')
+        onset_envelope = librosa.onset.onset_strength(S=mel_db, sr=sr, n_fft=n_fft, hop_length=hop_length)
+        onsets = librosa.onset.onset_detect(onset_envelope=onset_envelope, sr=sr, hop_length=hop_length,
+                                            units='time')
         onset_rate = len(onsets) / duration if duration > 0 else 0
         
         # Spectral contrast
-        contrast = librosa.feature.spectral_contrast(y=y, sr=sr)
-        contrast_mean = [float(np.mean(c)) for c in contrast]
+        contrast = librosa.feature.spectral_contrast(S=magnitude, sr=sr)
+        contrast_mean = contrast.mean(axis=1).tolist()
         
-        # Harmonic-percussive separation
-        y_harmonic, y_percussive = librosa.effects.hpss(y)
+        # Harmonic-percussive separation on the shared STFT (what librosa.effects.hpss
+        # does after computing its own)
+        stft_harmonic, stft_percussive = librosa.decompose.hpss(stft)
+        y_harmonic = librosa.istft(stft_harmonic, hop_length=hop_length, n_fft=n_fft,
+                                   dtype=y.dtype, length=len(y))
+        y_percussive = librosa.istft(stft_percussive, hop_length=hop_length, n_fft=n_fft,
+                                     dtype=y.dtype, length=len(y))
         harmonic_ratio = float(np.mean(np.abs(y_harmonic)) / (np.mean(np.abs(y)) + 1e-8))
         percussive_ratio = float(np.mean(np.abs(y_percussive)) / (np.mean(np.abs(y)) + 1e-8))
         
+        # Bin sums, flux, irregularity and entropy in one compiled sweep over the frames
+        bin_totals, spectral_irregularity, spectral_flux, spectral_entropy, voiced = \
+            _spectral_frame_stats(magnitude)
+        
         # Spectral flux (temporal spectral change)
-        stft = librosa.stft(y)
-        spectral_flux = np.sum(np.diff(np.abs(stft), axis=1) ** 2, axis=0)
         spectral_flux_mean = float(np.mean(spectral_flux))
         spectral_flux_std = float(np.std(spectral_flux))
         
         # Envelope analysis (amplitude dynamics)
         envelope = np.abs(y)
-        # Simple smoothing using moving average (10ms window)
+        # Simple smoothing using moving average (10ms window); the running-sum
+        # filter is O(n) whatever the window, same alignment as convolve(mode='same')
         window_length = int(sr * 0.01)
         if window_length > 1:
-            envelope_smooth = np.convolve(envelope, np.ones(window_length)/window_length, mode='same')
+            envelope_smooth = uniform_filter1d(envelope, window_length, mode='constant', cval=0.0)
         else:
             envelope_smooth = envelope
         
+        # Peak, attack and decay landmarks in a single compiled pass
+        peak_idx, attack_start, attack_end, decay_point = _envelope_points(envelope_smooth)
+        peak_val = envelope_smooth[peak_idx]
+        
         # Attack time (time to reach 90% of peak from 10%)
-        peak_val = np.max(envelope_smooth)
         if peak_val > 0:
-            attack_start = np.argmax(envelope_smooth > 0.1 * peak_val)
-            attack_end = np.argmax(envelope_smooth > 0.9 * peak_val)
             attack_time = (attack_end - attack_start) / sr if attack_end > attack_start else 0
         else:
             attack_time = 0
         
-        # Decay analysis (from peak to sustained level)
-        peak_idx = np.argmax(envelope_smooth)
+        # Decay analysis (from peak to half the peak level)
         if peak_idx < len(envelope_smooth) - 1 and peak_val > 0:
-            post_peak = envelope_smooth[peak_idx:]
-            decay_threshold = 0.5 * peak_val
-            decay_point = np.argmax(post_peak < decay_threshold)
             decay_time = decay_point / sr if decay_point > 0 else 0
         else:
             decay_time = 0
@@ -141,11 +321,10 @@ class AudioFeatureExtractor:
         sustained_level = float(np.mean(envelope_smooth[mid_start:mid_end])) if mid_end > mid_start else 0
         
         # Dynamic range
-        dynamic_range = float(np.max(envelope_smooth) - np.min(envelope_smooth))
+        dynamic_range = float(peak_val - np.min(envelope_smooth))
         
         # Energy density clusters (frequency band analysis)
-        magnitude = np.abs(stft)
-        freqs = librosa.fft_frequencies(sr=sr)
+        freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
         
         # Define frequency bands (Hz)
         bands = {
@@ -159,12 +338,16 @@ class AudioFeatureExtractor:
             'air': (16000, sr//2)
         }
         
+        # Mean magnitude per frequency bin, prefix-summed so each band's mean over
+        # its inclusive [low, high] range is a difference of two cumulative sums
+        bin_sums = np.concatenate(([0.0], np.cumsum(bin_totals / magnitude.shape[1])))
+        lows = np.searchsorted(freqs, [low for low, _ in bands.values()], side='left')
+        highs = np.searchsorted(freqs, [high for _, high in bands.values()], side='right')
+        
         band_energies = {}
-        for band_name, (low, high) in bands.items():
-            band_mask = (freqs >= low) & (freqs <= high)
-            if np.any(band_mask):
-                band_energy = np.mean(magnitude[band_mask, :])
-                band_energies[f'{band_name}_energy'] = float(band_energy)
+        for band_name, lo, hi in zip(bands, lows, highs):
+            if hi > lo:
+                band_energies[f'{band_name}_energy'] = float((bin_sums[hi] - bin_sums[lo]) / (hi - lo))
             else:
                 band_energies[f'{band_name}_energy'] = 0.0
         
@@ -176,31 +359,22 @@ class AudioFeatureExtractor:
         else:
             dominant_band = 'mid_energy'
         
-        # Perceptual qualities
-        spectral_irregularity = []
-        for frame in magnitude.T:
-            if len(frame) > 2:
-                diffs = np.abs(np.diff(frame))
-                irregularity = np.sum(diffs) / (np.sum(frame) + 1e-8)
-                spectral_irregularity.append(irregularity)
-        
-        irregularity_mean = float(np.mean(spectral_irregularity)) if spectral_irregularity else 0.0
-        irregularity_std = float(np.std(spectral_irregularity)) if spectral_irregularity else 0.0
+        # Perceptual qualities (per frame)
+        if magnitude.shape[0] > 2 and magnitude.shape[1] > 0:
+            irregularity_mean = float(np.mean(spectral_irregularity))
+            irregularity_std = float(np.std(spectral_irregularity))
+        else:
+            irregularity_mean = irregularity_std = 0.0
         
         # Pitch salience (how "melodic" vs "textural")
         pitch_salience = harmonic_ratio / (harmonic_ratio + percussive_ratio + 1e-8)
         
-        # Spectral entropy (chaos vs order)
-        spectral_entropy = []
-        for frame in magnitude.T:
-            if np.sum(frame) > 0:
-                prob = frame / np.sum(frame)
-                prob = prob[prob > 0]
-                entropy = -np.sum(prob * np.log2(prob + 1e-8))
-                spectral_entropy.append(entropy)
-        
-        entropy_mean = float(np.mean(spectral_entropy)) if spectral_entropy else 0.0
-        entropy_std = float(np.std(spectral_entropy)) if spectral_entropy else 0.0
+        # Spectral entropy (chaos vs order) over non-silent frames
+        if np.any(voiced):
+            entropy_mean = float(np.mean(spectral_entropy[voiced]))
+            entropy_std = float(np.std(spectral_entropy[voiced]))
+        else:
+            entropy_mean = entropy_std = 0.0
         
         # Roughness coefficient (sensory dissonance)
         roughness = irregularity_mean * (1 - pitch_salience)
@@ -215,7 +389,7 @@ class AudioFeatureExtractor:
             'spectral_rolloff_mean': round(float(np.mean(spectral_rolloff)), 1),
             'spectral_bandwidth_mean': round(float(np.mean(spectral_bandwidth)), 1),
             'zero_crossing_rate_mean': round(float(np.mean(zero_crossing_rate)), 4),
-            'tempo': round(float(tempo), 1),
+            'tempo': round(float(np.atleast_1d(tempo)[0]), 1),  # librosa >= 0.10.2 returns an array
             'onset_rate': round(onset_rate, 2),
             'harmonic_ratio': round(harmonic_ratio, 3),
             'percussive_ratio': round(percussive_ratio, 3),
@@ -56,9 +56,10 @@ class HibikidoServer:
         ):
             return False
         
-        # Setup orchestrator callbacks
+        # Setup orchestrator callbacks (manifestation and niche share one bundle)
         self.orchestrator.set_manifest_callback(self.osc_handler.send_manifest)
         self.orchestrator.set_niche_callback(self.osc_handler.send_niche)
+        self.orchestrator.set_bundle_callback(self.osc_handler.send_manifest_and_niche)
         
         # Register OSC handlers
         self.osc_router.register_handlers(self.command_handlers)
@@ -122,6 +123,7 @@ class HibikidoServer:
         
         try:
             self.osc_handler.close()
+            self.embedding_manager.close()
             self.db_manager.close()
             logger.info("Shutdown complete")
         except Exception as e:
@@ -6,38 +6,100 @@ Manages time-perceptual niches using Bark band cosine similarity.
 All results go through the queue - orchestrator decides when to manifest.
 """
 
+import sys
 import time
-import math
-import json
-from typing import Dict, List, Any, Optional, Callable
+from collections import deque, namedtuple
+from typing import Dict, List, Any, Callable, Optional
 import logging
-from .bark_analyzer import BarkAnalyzer
+import numpy as np
+from numba import njit
 
 logger = logging.getLogger(__name__)
 
+# Bark vector of a manifestation without one; an immutable tuple, so a single
+# shared instance serves every default instead of a fresh list per lookup
+ZERO_BARK_BANDS = (0.0,) * 24
+
+# A queued manifestation with its Bark vector resolved and normalized once at
+# queue time; fields are read by attribute on every pass instead of dict lookups
+QueueEntry = namedtuple('QueueEntry', 'data request_time bark_bands bark_raw bark_norm_vec bark_norm')
+
+
+# The kernels below run on 24-element vectors, where NumPy's per-call dispatch
+# costs more than the arithmetic; explicit signatures compile them (or load
+# them from the on-disk cache) at import instead of on the first manifestation
+
+@njit("float64(float64[:], float64[:])", cache=True)
+def _normalize_kernel(vector, out):
+    """Write vector scaled to unit length into out (zeros stay zeros) and return its L2 norm."""
+    total = 0.0
+    for i in range(vector.shape[0]):
+        total += vector[i] * vector[i]
+    norm = np.sqrt(total)
+    scale = norm if norm > 0 else 1.0
+    for i in range(vector.shape[0]):
+        out[i] = vector[i] / scale
+    return norm
+
+
+@njit("boolean(float64[:], float64[:], float64)", cache=True)
+def _conflict_kernel(sound_norm, ecosystem_norm, threshold):
+    """Whether the cosine similarity of two unit-length (or zero) vectors exceeds threshold."""
+    similarity = 0.0
+    for i in range(sound_norm.shape[0]):
+        similarity += sound_norm[i] * ecosystem_norm[i]
+    return similarity > threshold
+
+
 class Orchestrator:
-    def __init__(self, bark_similarity_threshold: float = 0.5):
+    # Length of the Bark band vectors compared by the orchestrator
+    BARK_BANDS = 24
+    
+    # Frees between full recomputes of the incrementally maintained ecosystem sum
+    # (bounds floating-point drift from repeated add/subtract)
+    ECOSYSTEM_RESYNC_INTERVAL = 256
+    
+    # Initial rows of the niche matrix (doubled when full)
+    NICHE_CAPACITY = 16
+    
+    def __init__(self, bark_similarity_threshold: float = 0.5, max_queue_size: Optional[int] = None):
         """
         Initialize orchestrator.
         
         Args:
             bark_similarity_threshold: Maximum allowed Bark band cosine similarity (0.5 = 50%)
+            max_queue_size: Maximum number of manifestations waiting for a free niche
+                (None = unbounded; further manifestations are dropped once it is reached)
         """
         self.bark_similarity_threshold = bark_similarity_threshold
+        self.max_queue_size = max_queue_size
         
-        # Active niches: list of dicts with manifestation_id, bark_bands_raw, bark_norm
-        self.active_niches = []
+        # Active niches as parallel arrays: _niche_ids[i] owns row i of the
+        # contiguous Bark matrix, and _niche_rows maps an ID back to its row
+        self._niche_ids: List[str] = []
+        self._niche_rows: Dict[str, int] = {}
+        self._niche_matrix = np.zeros((self.NICHE_CAPACITY, self.BARK_BANDS))
         
-        # Cached ecosystem state for performance
-        self.ecosystem_raw = [0.0] * 24
-        self.ecosystem_norm = [0.0] * 24
+        # Cached ecosystem state, updated in place as niches come and go
+        self.ecosystem_raw = np.zeros(self.BARK_BANDS)
+        self.ecosystem_norm = np.zeros(self.BARK_BANDS)
+        self._frees_since_resync = 0
         
-        # Queue for manifestations: list of (manifestation_data, request_time)
-        self.queue = []
+        # Queue for manifestations: deque of QueueEntry
+        self.queue = deque()
         
-        # Callbacks for sending manifestations and niche updates
+        # Set whenever a queued item could newly fit (niche registered or freed,
+        # item added); a pass without it would find every item conflicting again
+        self._ecosystem_dirty = False
+        
+        # Source of unique manifestation ID suffixes
+        self._mid_counter = 0
+        
+        # Callbacks for sending manifestations and niche updates; the bundle
+        # callback sends both at once and takes precedence when set
         self.manifest_callback = None
         self.niche_callback = None
+        self.bundle_callback = None
         
         logger.info(f"Orchestrator initialized: {bark_similarity_threshold:.1f} Bark similarity threshold")
     
@@ -49,10 +111,20 @@ class Orchestrator:
         """Set callback function for sending niche updates."""
         self.niche_callback = callback
     
+    def set_bundle_callback(self, callback: Callable):
+        """Set callback function sending a manifestation together with its niche update."""
+        self.bundle_callback = callback
+    
     def process_queue(self):
         """Manually trigger queue processing (for batch operations)."""
         self._process_queue()
     
+    def available_slots(self) -> int:
+        """Number of manifestations that can still be queued (sys.maxsize when unbounded)."""
+        if self.max_queue_size is None:
+            return sys.maxsize
+        return max(self.max_queue_size - len(self.queue), 0)
+    
     def queue_manifestation(self, manifestation_data: Dict[str, Any]) -> bool:
         """
         Queue a manifestation for orchestrator processing.
@@ -62,22 +134,44 @@ class Orchestrator:
             manifestation_data: {
                 "index": int, "collection": str, "score": float,
                 "path": str, "description": str, "start": float, "end": float,
-                "parameters": str, "sound_id": str, "bark_bands": List[float], 
-                "duration": float
+                "parameters": str, "sound_id": str, "bark_bands_raw": List[float]
             }
+            Any bark_norm given is ignored; the norm is computed from bark_bands_raw
             
         Returns:
-            True if queued successfully
+            True if queued successfully, False if the queue is full or on error
         """
         try:
-            request_time = time.time()
-            self.queue.append((manifestation_data, request_time))
+            if self.max_queue_size is not None and len(self.queue) >= self.max_queue_size:
+                logger.warning(f"Queue full ({self.max_queue_size}), dropping manifestation")
+                return False
             
-            sound_id = manifestation_data.get("sound_id", "unknown")
-            logger.debug(f"Queued manifestation: {sound_id}")
+            # Normalize the Bark vector once; it is compared on every pass while queued
+            bark_bands = manifestation_data.get("bark_bands_raw", ZERO_BARK_BANDS)
+            bark_raw = np.asarray(bark_bands, dtype=np.float64)
+            if bark_raw.shape != (self.BARK_BANDS,):
+                # The numba kernels do no bounds checking against the ecosystem buffers
+                logger.warning(f"Rejected manifestation {manifestation_data.get('sound_id', 'unknown')}: "
+                               f"bark_bands_raw must hold {self.BARK_BANDS} values, got shape {bark_raw.shape}")
+                return False
+            bark_norm_vec = np.empty_like(bark_raw)
+            bark_norm = _normalize_kernel(bark_raw, bark_norm_vec)
+            entry = QueueEntry(manifestation_data, time.monotonic(), bark_bands, bark_raw, bark_norm_vec, bark_norm)
             
-            # Process queue immediately after each addition - event-driven approach
-            self._process_queue()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Queued manifestation: {manifestation_data.get('sound_id', 'unknown')}")
+            
+            if not self._ecosystem_dirty and (self.bundle_callback or self.manifest_callback):
+                # Every queued item already conflicts with the unchanged ecosystem,
+                # so only the new one can fit - check it alone
+                if not self._try_manifest(entry, entry.request_time):
+                    self.queue.append(entry)
+            else:
+                self.queue.append(entry)
+                self._ecosystem_dirty = True
+                
+                # Process queue immediately after each addition - event-driven approach
+                self._process_queue()
             return True
             
         except Exception as e:
@@ -87,140 +181,180 @@ class Orchestrator:
     
     def _process_queue(self):
         """Process the manifestation queue - send manifestations when niches are free."""
-        if not self.queue or not self.manifest_callback:
+        if not self.queue or not (self.bundle_callback or self.manifest_callback) or not self._ecosystem_dirty:
             return
         
-        now = time.time()
-        remaining_queue = []
+        # Niches registered during this pass set the flag again
+        self._ecosystem_dirty = False
+        now = time.monotonic()
         manifestations_sent = 0
         
-        # Process queue in FIFO order
-        for manifestation_data, request_time in self.queue:
+        # Process queue in FIFO order, rotating items that still conflict to the
+        # back so the queue keeps its order after one full turn
+        for _ in range(len(self.queue)):
+            entry = self.queue.popleft()
             try:
-                # Extract Bark bands info
-                sound_id = manifestation_data.get("sound_id", "unknown")
-                bark_bands_raw = manifestation_data.get("bark_bands_raw", [0.0] * 24)
-                bark_norm = manifestation_data.get("bark_norm", 0.0)
-                
-                # Check for conflicts against cached ecosystem
-                has_conflict = self._find_conflict(bark_bands_raw)
-                
-                if not has_conflict:
-                    # No conflict - generate unique manifestation ID and register niche
-                    manifestation_id = f"{manifestation_data['index']}_{int(now * 1000)}"
-                    self._register_niche(manifestation_id, bark_bands_raw, bark_norm)
-                    
-                    # Send manifestation via callback
-                    self.manifest_callback(
-                        manifestation_id,
-                        manifestation_data["collection"],
-                        manifestation_data["score"],
-                        manifestation_data["path"],
-                        manifestation_data["description"],
-                        manifestation_data["start"],
-                        manifestation_data["end"],
-                        manifestation_data["parameters"]
-                    )
-                    
-                    # Send niche update
-                    if self.niche_callback:
-                        self.niche_callback(manifestation_id, bark_bands_raw)
-                    
+                if self._try_manifest(entry, now):
                     manifestations_sent += 1
-                    logger.debug(f"Manifested: {manifestation_id} [Bark norm: {bark_norm:.3f}] "
-                               f"(queued for {now - request_time:.1f}s)")
                 else:
                     # Still has conflict - keep in queue
-                    remaining_queue.append((manifestation_data, request_time))
+                    self.queue.append(entry)
                     
             except Exception as e:
                 logger.error(f"Failed to process queued manifestation: {e}")
                 # Drop this manifestation to avoid infinite loops
         
-        # Update queue with remaining items
-        self.queue = remaining_queue
-        
-        if manifestations_sent > 0:
+        if manifestations_sent > 0 and logger.isEnabledFor(logging.DEBUG):
             logger.debug(f"Processed queue: {manifestations_sent} manifestations sent, "
                         f"{len(self.queue)} still queued")
     
-    def _find_conflict(self, new_sound_raw: List[float]) -> bool:
+    def _try_manifest(self, entry: QueueEntry, now: float) -> bool:
+        """
+        Manifest a queued sound if it fits the current ecosystem.
+        
+        Returns:
+            True if the sound was manifested and its niche registered,
+            False if it conflicts and should stay queued
+        """
+        # Check for conflicts against cached ecosystem
+        if self._find_conflict(entry.bark_norm_vec):
+            return False
+        
+        manifestation_data = entry.data
+        bark_bands_raw = entry.bark_bands
+        
+        # No conflict - generate unique manifestation ID and register niche
+        self._mid_counter += 1
+        manifestation_id = f"{manifestation_data['index']}_{self._mid_counter}"
+        self._register_niche(manifestation_id, entry.bark_raw)
+        
+        manifest_args = (
+            manifestation_id,
+            manifestation_data["collection"],
+            manifestation_data["score"],
+            manifestation_data["path"],
+            manifestation_data["description"],
+            manifestation_data["start"],
+            manifestation_data["end"],
+            manifestation_data["parameters"]
+        )
+        if self.bundle_callback:
+            # Manifestation and niche update in a single send
+            self.bundle_callback(*manifest_args, bark_bands_raw)
+        else:
+            # Send manifestation via callback
+            self.manifest_callback(*manifest_args)
+            
+            # Send niche update
+            if self.niche_callback:
+                self.niche_callback(manifestation_id, bark_bands_raw)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Manifested: {manifestation_id} [Bark norm: {entry.bark_norm:.3f}] "
+                         f"(queued for {now - entry.request_time:.1f}s)")
+        return True
+    
+    def _find_conflict(self, new_sound_norm: np.ndarray) -> bool:
         """
         Find if new sound conflicts with current ecosystem.
         
         Args:
-            new_sound_raw: Raw Bark band energy vector of new sound
+            new_sound_norm: Unit-length Bark band vector of new sound (zeros if silent)
             
         Returns:
             True if conflict exists, False otherwise
         """
-        if not self.active_niches:
+        if not self._niche_ids:
             return False
         
-        # Normalize new sound for comparison
-        new_sound_norm = BarkAnalyzer.normalize_vector(new_sound_raw)
-        
-        # Compare against cached normalized ecosystem
-        similarity = BarkAnalyzer.cosine_similarity(new_sound_norm, self.ecosystem_norm)
-        
-        return similarity > self.bark_similarity_threshold
+        # Cosine similarity against the cached unit-length ecosystem (zero when either is silent)
+        return _conflict_kernel(new_sound_norm, self.ecosystem_norm, self.bark_similarity_threshold)
     
     
-    def _register_niche(self, manifestation_id: str, bark_bands_raw: List[float], bark_norm: float):
+    def _register_niche(self, manifestation_id: str, bark_bands_raw: np.ndarray):
         """Register a new active niche and update cached ecosystem."""
-        niche = {
-            "manifestation_id": manifestation_id,
-            "bark_bands_raw": bark_bands_raw,
-            "bark_norm": bark_norm
-        }
-        self.active_niches.append(niche)
+        row = len(self._niche_ids)
+        if row == len(self._niche_matrix):
+            grown = np.zeros((2 * row, self.BARK_BANDS))
+            grown[:row] = self._niche_matrix
+            self._niche_matrix = grown
+        self._niche_matrix[row] = bark_bands_raw
+        self._niche_ids.append(manifestation_id)
+        self._niche_rows[manifestation_id] = row
         
-        # Update cached ecosystem
-        self._update_ecosystem_cache()
+        # Add the new niche to the cached ecosystem
+        self.ecosystem_raw += self._niche_matrix[row]
+        self._normalize_ecosystem()
+        self._ecosystem_dirty = True
     
     def free_manifestation(self, manifestation_id: str) -> bool:
         """Manually free a manifestation by ID and update ecosystem."""
-        before_count = len(self.active_niches)
-        self.active_niches = [n for n in self.active_niches if n["manifestation_id"] != manifestation_id]
+        row = self._niche_rows.get(manifestation_id)
         
-        freed = len(self.active_niches) < before_count
+        freed = row is not None
         if freed:
-            # Update cached ecosystem after removal
-            self._update_ecosystem_cache()
+            # Subtract the removed niche, recomputing from scratch now and then
+            # (and when the ecosystem empties) so rounding errors cannot accumulate
+            self._frees_since_resync += 1
+            resync = (len(self._niche_ids) == 1 or
+                      self._frees_since_resync >= self.ECOSYSTEM_RESYNC_INTERVAL)
+            if not resync:
+                self.ecosystem_raw -= self._niche_matrix[row]
+            self._remove_niche(row)
+            
+            if resync:
+                self._update_ecosystem_cache()
+            else:
+                self._normalize_ecosystem()
+            self._ecosystem_dirty = True
             
             # Process queue immediately - new sounds may now fit
             self._process_queue()
             
-            logger.debug(f"Freed manifestation: {manifestation_id}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Freed manifestation: {manifestation_id}")
         else:
             logger.warning(f"Manifestation not found for freeing: {manifestation_id}")
         return freed
     
+    def _remove_niche(self, row: int):
+        """Remove a niche by moving the last niche (ID and matrix row) into its place."""
+        last = len(self._niche_ids) - 1
+        del self._niche_rows[self._niche_ids[row]]
+        if row != last:
+            moved_id = self._niche_ids[last]
+            self._niche_ids[row] = moved_id
+            self._niche_rows[moved_id] = row
+            self._niche_matrix[row] = self._niche_matrix[last]
+        self._niche_ids.pop()
+    
     def _update_ecosystem_cache(self):
-        """Update cached ecosystem raw and normalized vectors."""
-        if not self.active_niches:
-            self.ecosystem_raw = [0.0] * 24
-            self.ecosystem_norm = [0.0] * 24
+        """Recompute cached ecosystem raw and normalized vectors from all active niches."""
+        self._frees_since_resync = 0
+        if not self._niche_ids:
+            self.ecosystem_raw.fill(0.0)
+            self.ecosystem_norm.fill(0.0)
             return
         
         # Sum all raw vectors
-        self.ecosystem_raw = [0.0] * 24
-        for niche in self.active_niches:
-            for i in range(24):
-                self.ecosystem_raw[i] += niche["bark_bands_raw"][i]
-        
-        # Normalize the combined ecosystem
-        self.ecosystem_norm = BarkAnalyzer.normalize_vector(self.ecosystem_raw)
+        np.sum(self._niche_matrix[:len(self._niche_ids)], axis=0, out=self.ecosystem_raw)
+        self._normalize_ecosystem()
+    
+    def _normalize_ecosystem(self):
+        """Refresh the unit-length ecosystem vector from the raw sum."""
+        norm = _normalize_kernel(self.ecosystem_raw, self.ecosystem_norm)
         
-        logger.debug(f"Updated ecosystem cache: {len(self.active_niches)} niches, "
-                    f"total energy: {BarkAnalyzer.vector_norm(self.ecosystem_raw):.3f}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Updated ecosystem cache: {len(self._niche_ids)} niches, "
+                        f"total energy: {norm:.3f}")
     
     
     def get_stats(self) -> Dict[str, Any]:
         """Get orchestrator statistics."""
         return {
-            "active_niches": len(self.active_niches),
+            "active_niches": len(self._niche_ids),
             "queued_requests": len(self.queue),
+            "max_queue_size": self.max_queue_size,
             "bark_similarity_threshold": self.bark_similarity_threshold
         }
     
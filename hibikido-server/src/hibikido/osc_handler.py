@@ -7,8 +7,13 @@ Handles all OSC communication using the new invocation paradigm.
 """
 
 import json
-from typing import List, Dict, Any
+import socket
+import struct
+from types import MappingProxyType
+from typing import List, Dict, Tuple
 from pythonosc.dispatcher import Dispatcher
+from pythonosc.osc_bundle_builder import OscBundleBuilder, IMMEDIATELY
+from pythonosc.osc_message_builder import OscMessageBuilder
 from pythonosc.osc_server import BlockingOSCUDPServer
 from pythonosc.udp_client import SimpleUDPClient
 import logging
@@ -16,43 +21,54 @@ import logging
 logger = logging.getLogger(__name__)
 
 class OSCHandler:
+    # OSC Address definitions (updated for invocation protocol); static, shared by all instances
+    addresses = MappingProxyType({
+        # Input addresses
+        'invoke': '/invoke',  # Changed from 'search'
+        'add_recording': '/add_recording',
+        'add_effect': '/add_effect', 
+        'add_segment': '/add_segment',
+        'add_segments_batch': '/add_segments_batch',
+        'add_preset': '/add_preset',
+        'rebuild_index': '/rebuild_index',
+        'stats': '/stats',
+        'free': '/free',
+        'flush': '/flush',
+        'list_segments': '/list_segments',
+        'visualize': '/visualize',
+        'get_segment_field': '/get_segment_field',
+        'stop': '/stop',
+        
+        # Output addresses
+        'manifest': '/manifest',  # Changed from 'result'
+        'niche': '/niche',       # Niche status for ecosystem visualization
+        'confirm': '/confirm',
+        'stats_result': '/stats_result',
+        'segment_field': '/segment_field',
+        'error': '/error'
+        # Removed 'search_complete'
+    })
+    
+    # Send buffer of the non-blocking client socket (absorbs manifestation bursts)
+    SEND_BUFFER_SIZE = 1 << 20
+    
     def __init__(self, listen_ip: str = "127.0.0.1", listen_port: int = 9000,
-                 send_ip: str = "127.0.0.1", send_port: int = 9001):
+                 send_ip: str = "127.0.0.1", send_port: int = 9001,
+                 niche_blob: bool = False):
         self.listen_ip = listen_ip
         self.listen_port = listen_port
         self.send_ip = send_ip
         self.send_port = send_port
         
+        # Send /niche Bark bands as one little-endian float32 blob instead of 24 float arguments
+        self.niche_blob = niche_blob
+        
         self.client = None
         self.server = None
         self.dispatcher = None
         
-        # OSC Address definitions (updated for invocation protocol)
-        self.addresses = {
-            # Input addresses
-            'invoke': '/invoke',  # Changed from 'search'
-            'add_recording': '/add_recording',
-            'add_effect': '/add_effect', 
-            'add_segment': '/add_segment',
-            'add_preset': '/add_preset',
-            'rebuild_index': '/rebuild_index',
-            'stats': '/stats',
-            'free': '/free',
-            'flush': '/flush',
-            'list_segments': '/list_segments',
-            'visualize': '/visualize',
-            'get_segment_field': '/get_segment_field',
-            'stop': '/stop',
-            
-            # Output addresses
-            'manifest': '/manifest',  # Changed from 'result'
-            'niche': '/niche',       # Niche status for ecosystem visualization
-            'confirm': '/confirm',
-            'stats_result': '/stats_result',
-            'segment_field': '/segment_field',
-            'error': '/error'
-            # Removed 'search_complete'
-        }
+        # Messages dropped because the send buffer was full
+        self.dropped = 0
     
     def initialize(self) -> bool:
         """Initialize OSC client and server."""
@@ -60,6 +76,10 @@ class OSCHandler:
             # Setup client for sending messages
             self.client = SimpleUDPClient(self.send_ip, self.send_port)
             
+            # python-osc's socket is already non-blocking: a full send buffer raises
+            # BlockingIOError (counted as dropped), so give bursts more room first
+            self.client._sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.SEND_BUFFER_SIZE)
+            
             # Setup dispatcher for routing incoming messages
             self.dispatcher = Dispatcher()
             
@@ -74,14 +94,16 @@ class OSCHandler:
     def register_handlers(self, handlers: Dict[str, callable]):
         """Register message handlers with the dispatcher."""
         logger.info(f"Hibikidō OSC: Registering {len(handlers)} handlers")
+        unknown = handlers.keys() - self.addresses.keys()
+        if unknown:
+            logger.warning(f"Hibikidō OSC: Unknown OSC addresses: {', '.join(sorted(unknown))}")
+        
+        addresses = self.addresses
         for address_name, handler_func in handlers.items():
-            if address_name in self.addresses:
-                osc_address = self.addresses[address_name]
-                logger.info(f"Hibikidō OSC: Mapping {osc_address} -> {handler_func.__name__}")
-                self.dispatcher.map(osc_address, handler_func)
-                logger.debug(f"Hibikidō OSC: Registered handler for {osc_address}")
-            else:
-                logger.warning(f"Hibikidō OSC: Unknown OSC address: {address_name}")
+            if address_name in addresses:
+                self.dispatcher.map(addresses[address_name], handler_func)
+        logger.debug(f"Hibikidō OSC: Mapped "
+                     f"{', '.join(addresses[name] for name in handlers if name in addresses)}")
     
     def start_server(self) -> BlockingOSCUDPServer:
         """Start the OSC server."""
@@ -105,25 +127,64 @@ class OSCHandler:
             self.client.send_message(self.addresses['manifest'], [
                 manifestation_id, collection, score, path, description, start, end, parameters
             ])
-            logger.debug(f"Hibikidō OSC: Sent manifestation: {manifestation_id} - {description}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Hibikidō OSC: Sent manifestation: {manifestation_id} - {description}")
+        except BlockingIOError:
+            self._count_drop(f"manifestation {manifestation_id}")
         except Exception as e:
             logger.error(f"Hibikidō OSC: Failed to send manifestation: {e}")
     
     def send_niche(self, manifestation_id: str, bark_bands_raw: List[float]):
         """Send niche status message for ecosystem visualization."""
         try:
-            # Send manifestation_id followed by 24 bark band values
-            message_data = [manifestation_id] + bark_bands_raw
-            self.client.send_message(self.addresses['niche'], message_data)
-            logger.debug(f"Hibikidō OSC: Sent niche: {manifestation_id}")
+            self.client.send_message(self.addresses['niche'], self._niche_values(manifestation_id, bark_bands_raw))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Hibikidō OSC: Sent niche: {manifestation_id}")
+        except BlockingIOError:
+            self._count_drop(f"niche {manifestation_id}")
         except Exception as e:
             logger.error(f"Hibikidō OSC: Failed to send niche: {e}")
     
+    def send_manifest_and_niche(self, manifestation_id: str, collection: str, score: float,
+                                path: str, description: str, start: float, end: float,
+                                parameters: str, bark_bands_raw: List[float]):
+        """Send the manifestation and its niche status together in one OSC bundle (one datagram)."""
+        try:
+            bundle = OscBundleBuilder(IMMEDIATELY)
+            for address, values in (
+                (self.addresses['manifest'],
+                 [manifestation_id, collection, score, path, description, start, end, parameters]),
+                (self.addresses['niche'], self._niche_values(manifestation_id, bark_bands_raw))
+            ):
+                message = OscMessageBuilder(address=address)
+                for value in values:
+                    message.add_arg(value)
+                bundle.add_content(message.build())
+            self.client.send(bundle.build())
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Hibikidō OSC: Sent manifestation and niche: {manifestation_id} - {description}")
+        except BlockingIOError:
+            self._count_drop(f"manifestation {manifestation_id}")
+        except Exception as e:
+            logger.error(f"Hibikidō OSC: Failed to send manifestation: {e}")
+    
+    def _niche_values(self, manifestation_id: str, bark_bands_raw: List[float]) -> list:
+        """
+        Arguments of a /niche message: manifestation_id followed by the 24 Bark band
+        values, or by a single blob the receiver decodes with struct.unpack('<24f', blob).
+        """
+        if self.niche_blob:
+            return [manifestation_id, struct.pack(f"<{len(bark_bands_raw)}f", *bark_bands_raw)]
+        return [manifestation_id, *bark_bands_raw]
+    
     def send_confirm(self, message: str):
         """Send confirmation message."""
         try:
             self.client.send_message(self.addresses['confirm'], message)
-            logger.debug(f"Hibikidō OSC: Sent confirmation: {message}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Hibikidō OSC: Sent confirmation: {message}")
+        except BlockingIOError:
+            self._count_drop("confirmation")
         except Exception as e:
             logger.error(f"Hibikidō OSC: Failed to send confirmation: {e}")
     
@@ -132,22 +193,24 @@ class OSCHandler:
         try:
             self.client.send_message(self.addresses['error'], error_message)
             logger.warning(f"Hibikidō OSC: Sent error: {error_message}")
+        except BlockingIOError:
+            self._count_drop("error message")
         except Exception as e:
             logger.error(f"Hibikidō OSC: Failed to send error message: {e}")
     
+    def _count_drop(self, what: str):
+        """Record a message dropped because the send buffer was full."""
+        self.dropped += 1
+        logger.warning(f"Hibikidō OSC: Send buffer full, dropped {what} ({self.dropped} dropped in total)")
+    
     def send_ready(self):
         """Send ready signal."""
         self.send_confirm("hibikido_server_ready")
     
     @staticmethod
-    def parse_args(*args) -> Dict[str, Any]:
-        """Return all OSC arguments as strings indexed by arg1, arg2, ..."""
-        parsed: Dict[str, Any] = {}
-
-        for i, arg in enumerate(args):
-            parsed[f"arg{i + 1}"] = str(arg) if arg is not None else ""
-
-        return parsed
+    def parse_args(*args) -> Tuple[str, ...]:
+        """Return all OSC arguments as strings, in order (None becomes "")."""
+        return tuple("" if arg is None else str(arg) for arg in args)
     
     def close(self):
         """Close OSC connections."""
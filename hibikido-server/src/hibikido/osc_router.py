@@ -26,6 +26,7 @@ class OSCRouter:
             'add_recording': command_handlers.handle_add_recording,
             'add_effect': command_handlers.handle_add_effect,
             'add_segment': command_handlers.handle_add_segment,
+            'add_segments_batch': command_handlers.handle_add_segments_batch,
             'add_preset': command_handlers.handle_add_preset,
             'rebuild_index': command_handlers.handle_rebuild_index,
             'stats': command_handlers.handle_stats,
@@ -59,6 +60,7 @@ class OSCRouter:
         print("  /add_recording \"path\" \"description\" - add recording with 3-band onset analysis")
         print("  /add_effect \"path\" metadata     - add new effect with default preset")
         print("  /add_segment \"path\" \"description\" metadata - add new segment with onset times")
+        print("  /add_segments_batch \"path\" '[{...}]' - add many segments of one recording in one pass")
         print("  /add_preset \"text\" metadata     - add new effect preset")
         print("  /rebuild_index                   - rebuild FAISS index from database")
         print("  /stats                           - database and orchestrator statistics")
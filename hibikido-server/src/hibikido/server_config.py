@@ -8,58 +8,90 @@ Configuration loading and default settings.
 
 import json
 import logging
+from types import MappingProxyType
 from typing import Dict, Any
 
+try:
+    import orjson  # Optional faster JSON parser (pip install -e ".[json]")
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 
-def get_default_config() -> Dict[str, Any]:
-    """Default configuration settings."""
-    return {
+# Default settings, built once; nested one level deep with scalar values only
+_DEFAULT_CONFIG = MappingProxyType({
+    section: MappingProxyType(values) for section, values in {
         'database': {
             'data_dir': '../hibikido-data/database'
         },
         'embedding': {
             'model_name': 'all-MiniLM-L6-v2',
-            'index_file': '../hibikido-data/index/hibikido.index'
+            'index_file': '../hibikido-data/index/hibikido.index',
+            'flush_interval': 2.0,  # Seconds to coalesce index saves
+            'index_type': 'flat',   # 'flat' (exact), 'hnsw' (approximate), 'sq8' (4x smaller) or 'fp16' (2x smaller)
+            'use_gpu': True         # Flat index on GPU when CUDA and faiss-gpu are installed
         },
         'osc': {
             'listen_ip': '127.0.0.1',
             'listen_port': 9000,
             'send_ip': '127.0.0.1',
-            'send_port': 9001
+            'send_port': 9001,
+            'niche_blob': False     # Send /niche Bark bands as one float32 blob (smaller packets)
         },
         'search': {
             'top_k': 10,
             'min_score': 0.3
         },
         'orchestrator': {
-            'bark_similarity_threshold': 0.5   # 50%
+            'bark_similarity_threshold': 0.5,  # 50%
+            'max_queue_size': None             # Unbounded; a number drops results beyond it
         },
         'audio': {
-            'audio_directory': '../hibikido-data/audio'
+            'audio_directory': '../hibikido-data/audio',
+            'decode_cache_size': 1,  # Decoded recordings kept in memory (0 disables the cache)
+            'use_fftw': False,      # Route librosa FFTs through pyFFTW (pip install -e ".[fft]"); process-wide
+            'fftw_threads': 1       # Threads per FFT, capped at the CPU count
         }
-    }
+    }.items()
+})
+
+
+def get_default_config() -> Dict[str, Any]:
+    """Default configuration settings (a fresh copy the caller may modify)."""
+    return {section: dict(values) for section, values in _DEFAULT_CONFIG.items()}
 
 
 def load_config(config_file: str) -> Dict[str, Any]:
-    """Load configuration from JSON file."""
+    """Load configuration from JSON file (parsed with orjson when installed)."""
     try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(config_file, 'rb') as f:
+            data = f.read()
+        return orjson.loads(data) if orjson else json.loads(data)
     except Exception as e:
         logger.error(f"Failed to load config file {config_file}: {e}")
         return {}
 
 
 def merge_config(base_config: Dict[str, Any], override_config: Dict[str, Any]) -> Dict[str, Any]:
-    """Merge override config into base config."""
-    result = base_config.copy()
+    """
+    Merge override config into base config.
+    
+    Walks an explicit stack instead of recursing and copies only the sections
+    an override writes into; untouched sections are shared with base_config.
+    """
+    result = dict(base_config)
+    stack = [(result, override_config)]
     
-    for key, value in override_config.items():
-        if key in result and isinstance(result[key], dict) and isinstance(value, dict):
-            result[key] = merge_config(result[key], value)
-        else:
-            result[key] = value
+    while stack:
+        target, overrides = stack.pop()
+        for key, value in overrides.items():
+            current = target.get(key)
+            if isinstance(current, dict) and isinstance(value, dict):
+                merged = dict(current)
+                target[key] = merged
+                stack.append((merged, value))
+            else:
+                target[key] = value
     
     return result
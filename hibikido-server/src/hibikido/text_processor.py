@@ -7,13 +7,14 @@ Designed for prompt-engineered descriptions with all-MiniLM-L6-v2.
 Priority: segment > segmentation > recording (local > broader)
 """
 
-import re
 from typing import Dict, Any, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
 class TextProcessor:
+    __slots__ = ('max_chars',)
+    
     def __init__(self, max_chars: int = 400):
         """
         Initialize with character limit instead of word limit.
@@ -31,43 +32,40 @@ class TextProcessor:
         Uses descriptions as-is when available, minimal processing.
         Priority: segment > segmentation > recording
         """
-        try:
-            # Priority 1: Segment description (local) - use as-is if good
-            segment_desc = segment.get("description", "")
-            if segment_desc and len(segment_desc.strip()) > 10:
-                # Use segment description directly - it's prompt-engineered
-                return self._normalize_text(segment_desc)
-            
-            # Fallback: Combine contexts for sparse descriptions
-            contexts = []
-            
-            if segment_desc:
-                contexts.append(segment_desc)
-            
-            # Priority 2: Segmentation description (method context)
-            if segmentation:
-                seg_desc = segmentation.get("description", "")
-                if seg_desc:
-                    contexts.append(seg_desc)
-            
-            # Priority 3: Recording description (broader context)
-            if recording:
-                rec_desc = recording.get("description", "")
-                if rec_desc:
-                    contexts.append(rec_desc)
-            
-            # Combine contexts with character limit
-            combined = self._combine_contexts(contexts)
-            
-            if not combined:
-                combined = "audio segment"
-            
-            logger.debug(f"Segment embedding text: '{combined}' for {segment.get('_id', 'unknown')}")
-            return combined
-            
-        except Exception as e:
-            logger.error(f"Failed to create segment embedding text: {e}")
-            return self._normalize_text(segment.get("description", "audio segment"))
+        segment = segment or {}
+        
+        # Priority 1: Segment description (local) - use as-is if good
+        segment_desc = segment.get("description", "")
+        if self._is_descriptive(segment_desc):
+            # Use segment description directly - it's prompt-engineered
+            return self._normalize_text(segment_desc)
+        
+        # Fallback: Combine contexts for sparse descriptions
+        contexts = []
+        
+        if segment_desc:
+            contexts.append(segment_desc)
+        
+        # Priority 2: Segmentation description (method context)
+        if segmentation:
+            seg_desc = segmentation.get("description", "")
+            if seg_desc:
+                contexts.append(seg_desc)
+        
+        # Priority 3: Recording description (broader context)
+        if recording:
+            rec_desc = recording.get("description", "")
+            if rec_desc:
+                contexts.append(rec_desc)
+        
+        # Combine contexts with character limit
+        combined = self._combine_contexts(contexts)
+        
+        if not combined:
+            combined = "audio segment"
+        
+        logger.debug(f"Segment embedding text: '{combined}' for {segment.get('_id', 'unknown')}")
+        return combined
     
     def create_preset_embedding_text(self, preset: Dict[str, Any],
                                    effect: Dict[str, Any] = None) -> str:
@@ -76,58 +74,69 @@ class TextProcessor:
         Uses descriptions as-is when available.
         Priority: preset > effect
         """
-        try:
-            # Priority 1: Preset description (local) - use as-is if good
-            preset_desc = preset.get("description", "")
-            if preset_desc and len(preset_desc.strip()) > 10:
-                return self._normalize_text(preset_desc)
-            
-            # Fallback: Combine contexts
-            contexts = []
-            
-            if preset_desc:
-                contexts.append(preset_desc)
-            
-            # Priority 2: Effect description (broader context)
-            if effect:
-                effect_desc = effect.get("description", "")
-                if effect_desc:
-                    contexts.append(effect_desc)
-            
-            combined = self._combine_contexts(contexts)
-            
-            if not combined:
-                combined = "effect preset"
-            
-            logger.debug(f"Preset embedding text: '{combined}' for preset in {effect.get('_id', 'unknown') if effect else 'unknown'}")
-            return combined
-            
-        except Exception as e:
-            logger.error(f"Failed to create preset embedding text: {e}")
-            return self._normalize_text(preset.get("description", "effect preset"))
+        preset = preset or {}
+        
+        # Priority 1: Preset description (local) - use as-is if good
+        preset_desc = preset.get("description", "")
+        if self._is_descriptive(preset_desc):
+            return self._normalize_text(preset_desc)
+        
+        # Fallback: Combine contexts
+        contexts = []
+        
+        if preset_desc:
+            contexts.append(preset_desc)
+        
+        # Priority 2: Effect description (broader context)
+        if effect:
+            effect_desc = effect.get("description", "")
+            if effect_desc:
+                contexts.append(effect_desc)
+        
+        combined = self._combine_contexts(contexts)
+        
+        if not combined:
+            combined = "effect preset"
+        
+        logger.debug(f"Preset embedding text: '{combined}' for preset in {effect.get('_id', 'unknown') if effect else 'unknown'}")
+        return combined
+    
+    @staticmethod
+    def _is_descriptive(text: str) -> bool:
+        """
+        True if text is longer than 10 characters once stripped.
+        Only strips when an end is whitespace - descriptions are usually clean.
+        """
+        if not text or len(text) <= 10:
+            return False
+        if text[0].isspace() or text[-1].isspace():
+            return len(text.strip()) > 10
+        return True
     
     def _combine_contexts(self, contexts: list) -> str:
         """
         Combine context descriptions with character limit.
         Uses descriptions as-is, just concatenates and truncates if needed.
+        Stops at the first context that pushes past the limit: later ones
+        would be truncated away anyway.
         """
-        if not contexts:
-            return ""
+        parts = []
+        length = -len(" | ")  # No separator before the first part
         
-        # Filter out empty contexts
-        valid_contexts = [self._normalize_text(ctx) for ctx in contexts if ctx and ctx.strip()]
+        for ctx in contexts:
+            part = self._normalize_text(ctx)
+            if not part:
+                continue
+            parts.append(part)
+            length += len(" | ") + len(part)
+            if length > self.max_chars:
+                break
         
-        if not valid_contexts:
+        if not parts:
             return ""
         
-        # If only one context, use it directly
-        if len(valid_contexts) == 1:
-            return self._truncate_text(valid_contexts[0])
-        
         # Multiple contexts: join with separator
-        combined = " | ".join(valid_contexts)
-        
-        return self._truncate_text(combined)
+        return self._truncate_text(" | ".join(parts))
     
     def _normalize_text(self, text: str) -> str:
         """
@@ -137,12 +146,9 @@ class TextProcessor:
         if not text:
             return ""
         
-        text = str(text).strip()
-        
         # Only normalize whitespace - preserve all semantic content
-        text = re.sub(r'\s+', ' ', text)
-        
-        return text
+        # (split() with no separator drops leading/trailing runs and splits on any run)
+        return ' '.join(str(text).split())
     
     def _truncate_text(self, text: str, suffix: str = "...") -> str:
         """
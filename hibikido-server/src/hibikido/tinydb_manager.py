@@ -12,16 +12,129 @@ Maintains same interface as HibikidoDatabase but uses JSON files.
 - segmentations.json: Batch processing metadata
 """
 
+import json
+import math
 import os
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Tuple
+from itertools import islice
+from typing import Dict, Any, Iterator, List, Mapping, Optional, Tuple
+import numpy as np
 from tinydb import TinyDB, Query
 from tinydb.storages import JSONStorage
 from tinydb.middlewares import CachingMiddleware
+from tinydb.table import Table
 import logging
 
+try:
+    import orjson  # Optional faster JSON (pip install -e ".[json]")
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# Documents handed out per page when streaming a whole collection
+PAGE_SIZE = 1000
+
+# Queries built once; TinyDB caches search results per query until the table changes
+NO_FAISS_INDEX = ~Query().FAISS_index.exists()
+
+
+class OrjsonStorage(JSONStorage):
+    """
+    JSONStorage that parses and serializes with orjson through a binary handle.
+
+    Files stay plain JSON and interchangeable with JSONStorage. orjson cannot
+    represent NaN/Infinity (it reads them as errors and writes them as null),
+    so files and data holding them go through json instead. NumPy scalars and
+    arrays are stored as plain numbers and lists.
+    """
+
+    def __init__(self, path: str, create_dirs: bool = False, access_mode: str = 'rb+', **kwargs):
+        super().__init__(path, create_dirs=create_dirs, access_mode=access_mode, **kwargs)
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        self._handle.seek(0)
+        data = self._handle.read()
+        if not data:
+            return None  # Empty file: let TinyDB initialize the database
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return json.loads(data)
+
+    def write(self, data: Dict[str, Dict[str, Any]]):
+        try:
+            serialized = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+                                      | orjson.OPT_APPEND_NEWLINE)
+            # Every NaN/Infinity became null, so only output containing null needs the walk
+            if b'null' in serialized and _has_non_finite(data):
+                serialized = None
+        except TypeError:
+            serialized = None  # Let json report (or serialize) what orjson rejected
+        if serialized is None:
+            serialized = json.dumps(data, default=_numpy_to_builtin).encode('utf-8')
+        
+        self._handle.seek(0)
+        self._handle.write(serialized)
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.truncate()
+
+
+def _has_non_finite(value: Any) -> bool:
+    """True if a NaN or infinite float occurs anywhere in nested dicts/lists."""
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    if isinstance(value, dict):
+        return any(map(_has_non_finite, value.values()))
+    if isinstance(value, (list, tuple)):
+        return any(map(_has_non_finite, value))
+    if isinstance(value, (np.ndarray, np.floating)) and value.dtype.kind == 'f':
+        return not np.isfinite(value).all()
+    return False
+
+
+def _numpy_to_builtin(value: Any) -> Any:
+    """json.dumps default: NumPy scalars and arrays as Python numbers and lists."""
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Storage behind every table: orjson when installed, stdlib json otherwise
+TABLE_STORAGE = OrjsonStorage if orjson else JSONStorage
+
+
+class HibikidoTable(Table):
+    """TinyDB table with a batch update that gives each document its own fields."""
+
+    def update_by_id(self, updates: Mapping[int, Mapping[str, Any]]) -> List[int]:
+        """
+        Apply {doc_id: fields} in one table write.
+
+        Table.update() passes its callable a bare dict without the doc_id, so a
+        per-document update would otherwise depend on TinyDB's visiting order.
+
+        Returns:
+            IDs of the documents updated (missing IDs are skipped)
+        """
+        updated_ids = []
+
+        def updater(table: Dict[int, Dict[str, Any]]):
+            for doc_id, fields in updates.items():
+                document = table.get(doc_id)
+                if document is not None:
+                    document.update(fields)
+                    updated_ids.append(doc_id)
+
+        self._update_table(updater)
+        return updated_ids
+
+
+class HibikidoTinyDB(TinyDB):
+    """TinyDB whose tables are HibikidoTable."""
+    table_class = HibikidoTable
+
 class HibikidoDatabase:
     def __init__(self, data_dir: str = "../hibikido-data/database"):
         self.data_dir = os.path.abspath(data_dir)
@@ -36,35 +149,32 @@ class HibikidoDatabase:
         self.presets_db = None
         self.performances_db = None
         self.segmentations_db = None
+        
+        # Segments fetched by doc_id, dropped whenever a segment is updated
+        self._segment_cache: Dict[int, Dict[str, Any]] = {}
+        
+        # {collection: {FAISS_index: doc_id}}, built on first search and kept in
+        # step with inserts; batch updates (rebuilds) discard it
+        self._faiss_to_doc: Optional[Dict[str, Dict[int, int]]] = None
+        
+        # {(collection, field): {value: [doc_id, ...]}} for equality lookups on
+        # paths and IDs, each built on first lookup and kept in step with inserts
+        self._field_indexes: Dict[Tuple[str, str], Dict[Any, List[int]]] = {}
+        
+        # {collection: documents with a FAISS_index}, counted on first use and
+        # kept in step with inserts; batch updates discard the collection's count
+        self._embedded_counts: Dict[str, int] = {}
     
     def connect(self) -> bool:
         """Initialize TinyDB connections and setup databases."""
         try:
             # Initialize databases with caching for performance
-            self.recordings_db = TinyDB(
-                os.path.join(self.data_dir, 'recordings.json'),
-                storage=CachingMiddleware(JSONStorage)
-            )
-            self.segments_db = TinyDB(
-                os.path.join(self.data_dir, 'segments.json'),
-                storage=CachingMiddleware(JSONStorage)
-            )
-            self.effects_db = TinyDB(
-                os.path.join(self.data_dir, 'effects.json'),
-                storage=CachingMiddleware(JSONStorage)
-            )
-            self.presets_db = TinyDB(
-                os.path.join(self.data_dir, 'presets.json'),
-                storage=CachingMiddleware(JSONStorage)
-            )
-            self.performances_db = TinyDB(
-                os.path.join(self.data_dir, 'performances.json'),
-                storage=CachingMiddleware(JSONStorage)
-            )
-            self.segmentations_db = TinyDB(
-                os.path.join(self.data_dir, 'segmentations.json'),
-                storage=CachingMiddleware(JSONStorage)
-            )
+            self.recordings_db = self._open_table('recordings.json')
+            self.segments_db = self._open_table('segments.json')
+            self.effects_db = self._open_table('effects.json')
+            self.presets_db = self._open_table('presets.json')
+            self.performances_db = self._open_table('performances.json')
+            self.segmentations_db = self._open_table('segmentations.json')
             
             logger.info(f"TinyDB databases connected in: {self.data_dir}")
             return True
@@ -73,14 +183,17 @@ class HibikidoDatabase:
             logger.error(f"TinyDB connection failed: {e}")
             return False
     
+    def _open_table(self, filename: str) -> HibikidoTinyDB:
+        """Open a database file behind TinyDB's write cache (bulk writes flush it themselves)."""
+        return HibikidoTinyDB(os.path.join(self.data_dir, filename), storage=CachingMiddleware(TABLE_STORAGE))
+    
     # RECORDINGS METHODS (path-based)
     
     def add_recording(self, path: str, metadata: Dict[str, Any]) -> bool:
         """Add a new recording with arbitrary metadata using path as unique identifier."""
         try:
             # Check if already exists
-            Q = Query()
-            if self.recordings_db.search(Q.path == path):
+            if self._doc_ids("recordings", "path", path):
                 logger.warning(f"Duplicate recording path: {path}")
                 return False
             
@@ -92,7 +205,8 @@ class HibikidoDatabase:
             # Add required metadata (description and duration)
             recording.update(metadata)
             
-            self.recordings_db.insert(recording)
+            doc_id = self.recordings_db.insert(recording)
+            self._record_fields("recordings", recording, doc_id)
             logger.info(f"Added recording: {path}")
             return True
             
@@ -103,9 +217,7 @@ class HibikidoDatabase:
     def get_recording_by_path(self, path: str) -> Optional[Dict[str, Any]]:
         """Get recording by path."""
         try:
-            Q = Query()
-            results = self.recordings_db.search(Q.path == path)
-            return results[0] if results else None
+            return self._first_doc("recordings", "path", path)
         except Exception as e:
             logger.error(f"Failed to get recording {path}: {e}")
             return None
@@ -127,6 +239,10 @@ class HibikidoDatabase:
         except Exception as e:
             logger.error(f"Failed to get segments: {e}")
             return []
+
+    def iter_segments(self, page: int = PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+        """Yield all segments in lists of at most `page` documents."""
+        return self._iter_pages(self.segments_db, page)
     
     def add_segment(self, source_path: str, segmentation_id: str,
                    start: float, end: float, description: str,
@@ -159,6 +275,8 @@ class HibikidoDatabase:
             segment["FAISS_index"] = faiss_index
             
             doc_id = self.segments_db.insert(segment)
+            self._record_faiss_index("segments", faiss_index, doc_id)
+            self._record_fields("segments", segment, doc_id)
             logger.info(f"Added segment: {doc_id} - {description[:50]}")
             return True
             
@@ -166,21 +284,166 @@ class HibikidoDatabase:
             logger.error(f"Failed to add segment: {e}")
             return False
     
+    def add_segments(self, segments: List[Dict[str, Any]]) -> List[int]:
+        """
+        Add several segments in a single insert.
+
+        Each dict carries the same fields as add_segment() arguments
+        (source_path, segmentation_id, start, end, description, embedding_text,
+        FAISS_index, bark_bands_raw, bark_norm, onset_times_*, features).
+
+        Returns:
+            List of new document IDs (empty if failed)
+        """
+        try:
+            created_at = datetime.now().isoformat()
+            documents = [{**segment, "created_at": created_at} for segment in segments]
+
+            doc_ids = self.segments_db.insert_multiple(documents)
+            self.segments_db.storage.flush()  # Persist the whole batch now, not on a later write
+            for document, doc_id in zip(documents, doc_ids):
+                self._record_faiss_index("segments", document.get("FAISS_index"), doc_id)
+                self._record_fields("segments", document, doc_id)
+            logger.info(f"Added {len(doc_ids)} segments in batch")
+            return doc_ids
+
+        except Exception as e:
+            logger.error(f"Failed to add segments: {e}")
+            return []
+
+    def get_segment_by_doc_id(self, doc_id: int) -> Optional[Dict[str, Any]]:
+        """Get segment by TinyDB document ID (cached; treat the result as read-only)."""
+        segment = self._segment_cache.get(doc_id)
+        if segment is not None:
+            return segment
+        try:
+            segment = self.segments_db.get(doc_id=doc_id)
+            if segment is not None:
+                self._segment_cache[doc_id] = segment
+            return segment
+        except Exception as e:
+            logger.error(f"Failed to get segment {doc_id}: {e}")
+            return None
+    
+    def get_segment_field(self, doc_id: int, field: str, default: Any = None) -> Any:
+        """
+        Get a single segment field; dotted names reach nested values ("features.tempo").
+
+        Returns:
+            The field value, or default if the segment or field does not exist
+        """
+        segment = self.get_segment_by_doc_id(doc_id)
+        if segment is None:
+            return default
+        if field in segment:
+            return segment[field]
+        value = segment
+        for key in field.split('.'):
+            if not isinstance(value, dict) or key not in value:
+                return default
+            value = value[key]
+        return value
+    
     def get_segment_by_faiss_id(self, faiss_index: int) -> Optional[Dict[str, Any]]:
         """Get segment by FAISS index."""
         try:
-            Q = Query()
-            results = self.segments_db.search(Q.FAISS_index == faiss_index)
-            return results[0] if results else None
+            doc_id = self._faiss_map()["segments"].get(faiss_index)
+            return self.get_segment_by_doc_id(doc_id) if doc_id is not None else None
         except Exception as e:
             logger.error(f"Failed to get segment with FAISS index {faiss_index}: {e}")
             return None
     
+    def get_by_faiss_ids(self, faiss_indices: List[int]) -> Dict[int, Tuple[str, Dict[str, Any]]]:
+        """
+        Resolve several FAISS indices through the in-memory FAISS_index map.
+
+        Segments take precedence over presets for the same index, matching
+        get_segment_by_faiss_id() followed by get_preset_by_faiss_id().
+
+        Returns:
+            {faiss_index: (collection, document)} for the indices found
+        """
+        found: Dict[int, Tuple[str, Dict[str, Any]]] = {}
+        try:
+            faiss_to_doc = self._faiss_map()
+            segment_ids = faiss_to_doc["segments"]
+            preset_ids = faiss_to_doc["presets"]
+            for faiss_index in set(faiss_indices):
+                doc_id = segment_ids.get(faiss_index)
+                segment = self.get_segment_by_doc_id(doc_id) if doc_id is not None else None
+                if segment is not None:
+                    found[faiss_index] = ("segments", segment)
+                    continue
+                doc_id = preset_ids.get(faiss_index)
+                preset = self.presets_db.get(doc_id=doc_id) if doc_id is not None else None
+                if preset is not None:
+                    found[faiss_index] = ("presets", preset)
+            return found
+        except Exception as e:
+            logger.error(f"Failed to get documents for FAISS indices {faiss_indices}: {e}")
+            return found
+    
+    def _faiss_map(self) -> Dict[str, Dict[int, int]]:
+        """FAISS_index -> doc_id for segments and presets, built with one pass per table."""
+        if self._faiss_to_doc is None:
+            self._faiss_to_doc = {
+                "segments": self._map_faiss_indices(self.segments_db),
+                "presets": self._map_faiss_indices(self.presets_db)
+            }
+        return self._faiss_to_doc
+    
+    @staticmethod
+    def _map_faiss_indices(table) -> Dict[int, int]:
+        """Map each FAISS_index in a table to its first document (same order as search())."""
+        mapping: Dict[int, int] = {}
+        for document in table:
+            faiss_index = document.get("FAISS_index")
+            if faiss_index is not None:
+                mapping.setdefault(faiss_index, document.doc_id)
+        return mapping
+    
+    def _record_faiss_index(self, collection: str, faiss_index: Optional[int], doc_id: int):
+        """Add a newly inserted document to the FAISS_index map if it has been built."""
+        if self._faiss_to_doc is not None and faiss_index is not None:
+            self._faiss_to_doc[collection].setdefault(faiss_index, doc_id)
+    
+    def _doc_ids(self, collection: str, field: str, value: Any) -> List[int]:
+        """IDs of the documents whose field equals value, in table order (same as search())."""
+        index = self._field_indexes.get((collection, field))
+        if index is None:
+            index = {}
+            for document in getattr(self, f"{collection}_db"):
+                if field in document:
+                    index.setdefault(document[field], []).append(document.doc_id)
+            self._field_indexes[(collection, field)] = index
+        return index.get(value, [])
+    
+    def _first_doc(self, collection: str, field: str, value: Any) -> Optional[Dict[str, Any]]:
+        """First document whose field equals value, or None."""
+        doc_ids = self._doc_ids(collection, field, value)
+        return getattr(self, f"{collection}_db").get(doc_id=doc_ids[0]) if doc_ids else None
+    
+    def _record_fields(self, collection: str, document: Dict[str, Any], doc_id: int):
+        """Add a newly inserted document to the field indexes and embedding count of its collection."""
+        for (name, field), index in self._field_indexes.items():
+            if name == collection and field in document:
+                index.setdefault(document[field], []).append(doc_id)
+        if collection in self._embedded_counts and "FAISS_index" in document:
+            self._embedded_counts[collection] += 1
+    
+    def _embedded_count(self, collection: str) -> int:
+        """Number of documents with a FAISS_index field (same as searching FAISS_index.exists())."""
+        count = self._embedded_counts.get(collection)
+        if count is None:
+            count = sum(1 for document in getattr(self, f"{collection}_db") if "FAISS_index" in document)
+            self._embedded_counts[collection] = count
+        return count
+    
     def get_segments_by_recording_path(self, source_path: str) -> List[Dict[str, Any]]:
         """Get all segments for a recording by path."""
         try:
-            Q = Query()
-            results = self.segments_db.search(Q.source_path == source_path)
+            doc_ids = self._doc_ids("segments", "source_path", source_path)
+            results = [self.segments_db.get(doc_id=doc_id) for doc_id in doc_ids]
             # Sort by start time
             return sorted(results, key=lambda x: x.get('start', 0))
         except Exception as e:
@@ -193,8 +456,7 @@ class HibikidoDatabase:
         """Add a new segmentation method/run."""
         try:
             # Check if already exists
-            Q = Query()
-            if self.segmentations_db.search(Q.segmentation_id == segmentation_id):
+            if self._doc_ids("segmentations", "segmentation_id", segmentation_id):
                 logger.warning(f"Duplicate segmentation ID: {segmentation_id}")
                 return False
             
@@ -206,7 +468,8 @@ class HibikidoDatabase:
                 "created_at": datetime.now().isoformat()
             }
             
-            self.segmentations_db.insert(segmentation)
+            doc_id = self.segmentations_db.insert(segmentation)
+            self._record_fields("segmentations", segmentation, doc_id)
             logger.info(f"Added segmentation: {segmentation_id} - {method}")
             return True
             
@@ -217,9 +480,7 @@ class HibikidoDatabase:
     def get_segmentation(self, segmentation_id: str) -> Optional[Dict[str, Any]]:
         """Get segmentation by ID."""
         try:
-            Q = Query()
-            results = self.segmentations_db.search(Q.segmentation_id == segmentation_id)
-            return results[0] if results else None
+            return self._first_doc("segmentations", "segmentation_id", segmentation_id)
         except Exception as e:
             logger.error(f"Failed to get segmentation {segmentation_id}: {e}")
             return None
@@ -230,8 +491,7 @@ class HibikidoDatabase:
         """Add a new effect using path as unique identifier."""
         try:
             # Check if already exists
-            Q = Query()
-            if self.effects_db.search(Q.path == path):
+            if self._doc_ids("effects", "path", path):
                 logger.warning(f"Duplicate effect path: {path}")
                 return False
             
@@ -242,7 +502,8 @@ class HibikidoDatabase:
                 "created_at": datetime.now().isoformat()
             }
             
-            self.effects_db.insert(effect)
+            doc_id = self.effects_db.insert(effect)
+            self._record_fields("effects", effect, doc_id)
             logger.info(f"Added effect: {path} - {name}")
             return True
             
@@ -253,9 +514,7 @@ class HibikidoDatabase:
     def get_effect_by_path(self, path: str) -> Optional[Dict[str, Any]]:
         """Get effect by path."""
         try:
-            Q = Query()
-            results = self.effects_db.search(Q.path == path)
-            return results[0] if results else None
+            return self._first_doc("effects", "path", path)
         except Exception as e:
             logger.error(f"Failed to get effect {path}: {e}")
             return None
@@ -279,6 +538,8 @@ class HibikidoDatabase:
                 preset["FAISS_index"] = faiss_index
             
             doc_id = self.presets_db.insert(preset)
+            self._record_faiss_index("presets", faiss_index, doc_id)
+            self._record_fields("presets", preset, doc_id)
             logger.info(f"Added preset: {doc_id} - {description[:50]}")
             return True
             
@@ -286,21 +547,65 @@ class HibikidoDatabase:
             logger.error(f"Failed to add preset: {e}")
             return False
     
+    def add_presets(self, presets: List[Dict[str, Any]]) -> List[int]:
+        """
+        Add several presets in a single insert.
+
+        Each dict carries the same fields as add_preset() arguments
+        (effect_path, parameters, description, embedding_text, optional FAISS_index).
+
+        Returns:
+            List of new document IDs (empty if failed)
+        """
+        try:
+            created_at = datetime.now().isoformat()
+            documents = [{**preset, "created_at": created_at} for preset in presets]
+
+            doc_ids = self.presets_db.insert_multiple(documents)
+            self.presets_db.storage.flush()  # Persist the whole batch now, not on a later write
+            for document, doc_id in zip(documents, doc_ids):
+                self._record_faiss_index("presets", document.get("FAISS_index"), doc_id)
+                self._record_fields("presets", document, doc_id)
+            logger.info(f"Added {len(doc_ids)} presets in batch")
+            return doc_ids
+
+        except Exception as e:
+            logger.error(f"Failed to add presets: {e}")
+            return []
+    
     def get_preset_by_faiss_id(self, faiss_index: int) -> Optional[Dict[str, Any]]:
         """Get preset by FAISS index."""
         try:
-            Q = Query()
-            results = self.presets_db.search(Q.FAISS_index == faiss_index)
-            return results[0] if results else None
+            doc_id = self._faiss_map()["presets"].get(faiss_index)
+            return self.presets_db.get(doc_id=doc_id) if doc_id is not None else None
         except Exception as e:
             logger.error(f"Failed to get preset with FAISS index {faiss_index}: {e}")
             return None
     
+    def iter_presets(self, page: int = PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+        """Yield all presets in lists of at most `page` documents."""
+        return self._iter_pages(self.presets_db, page)
+    
+    @staticmethod
+    def _iter_pages(table, page: int) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Page over a table without building a Document for every row up front.
+
+        Updating fields of documents already handed out is safe between pages;
+        inserting or removing documents while iterating is not.
+        """
+        documents = iter(table)
+        while True:
+            batch = list(islice(documents, page))
+            if not batch:
+                return
+            yield batch
+    
     def get_presets_by_effect_path(self, effect_path: str) -> List[Dict[str, Any]]:
         """Get all presets for an effect by path."""
         try:
-            Q = Query()
-            return self.presets_db.search(Q.effect_path == effect_path)
+            doc_ids = self._doc_ids("presets", "effect_path", effect_path)
+            return [self.presets_db.get(doc_id=doc_id) for doc_id in doc_ids]
         except Exception as e:
             logger.error(f"Failed to get presets for effect {effect_path}: {e}")
             return []
@@ -308,8 +613,7 @@ class HibikidoDatabase:
     def get_segments_without_embeddings(self) -> List[Dict[str, Any]]:
         """Get all segments that don't have FAISS embeddings yet."""
         try:
-            Q = Query()
-            return self.segments_db.search(~Q.FAISS_index.exists())
+            return self.segments_db.search(NO_FAISS_INDEX)
         except Exception as e:
             logger.error(f"Failed to get segments without embeddings: {e}")
             return []
@@ -317,8 +621,7 @@ class HibikidoDatabase:
     def get_presets_without_embeddings(self) -> List[Dict[str, Any]]:
         """Get all presets that don't have FAISS embeddings yet."""
         try:
-            Q = Query()
-            return self.presets_db.search(~Q.FAISS_index.exists())
+            return self.presets_db.search(NO_FAISS_INDEX)
         except Exception as e:
             logger.error(f"Failed to get presets without embeddings: {e}")
             return []
@@ -329,8 +632,7 @@ class HibikidoDatabase:
         """Add a new performance session."""
         try:
             # Check if already exists
-            Q = Query()
-            if self.performances_db.search(Q.performance_id == performance_id):
+            if self._doc_ids("performances", "performance_id", performance_id):
                 logger.warning(f"Duplicate performance ID: {performance_id}")
                 return False
             
@@ -341,7 +643,8 @@ class HibikidoDatabase:
                 "created_at": datetime.now().isoformat()
             }
             
-            self.performances_db.insert(performance)
+            doc_id = self.performances_db.insert(performance)
+            self._record_fields("performances", performance, doc_id)
             logger.info(f"Added performance: {performance_id}")
             return True
             
@@ -368,10 +671,9 @@ class HibikidoDatabase:
                 doc['invocations'].append(invocation)
                 return doc
             
-            Q = Query()
             updated = self.performances_db.update(
                 update_invocations,
-                Q.performance_id == performance_id
+                doc_ids=self._doc_ids("performances", "performance_id", performance_id)
             )
             return len(updated) > 0
             
@@ -386,11 +688,10 @@ class HibikidoDatabase:
         try:
             recordings_count = len(self.recordings_db)
             segments_count = len(self.segments_db)
-            Q = Query()
-            segments_with_embeddings = len(self.segments_db.search(Q.FAISS_index.exists()))
+            segments_with_embeddings = self._embedded_count("segments")
             effects_count = len(self.effects_db)
             presets_count = len(self.presets_db)
-            presets_with_embeddings = len(self.presets_db.search(Q.FAISS_index.exists()))
+            presets_with_embeddings = self._embedded_count("presets")
             performances_count = len(self.performances_db)
             segmentations_count = len(self.segmentations_db)
             
@@ -464,8 +765,7 @@ class HibikidoDatabase:
     def update_recording_description(self, doc_id: int, description: str) -> bool:
         """Update recording description by document ID."""
         try:
-            Q = Query()
-            updated_count = self.recordings_db.update({'description': description}, doc_id=doc_id)
+            updated_count = self.recordings_db.update({'description': description}, doc_ids=[doc_id])
             if updated_count:
                 logger.info(f"Updated recording {doc_id} description")
                 return True
@@ -479,8 +779,8 @@ class HibikidoDatabase:
     def update_segment_description(self, doc_id: int, description: str) -> bool:
         """Update segment description by document ID."""
         try:
-            Q = Query()
-            updated_count = self.segments_db.update({'description': description}, doc_id=doc_id)
+            self._segment_cache.pop(doc_id, None)
+            updated_count = self.segments_db.update({'description': description}, doc_ids=[doc_id])
             if updated_count:
                 logger.info(f"Updated segment {doc_id} description")
                 return True
@@ -493,11 +793,51 @@ class HibikidoDatabase:
     
     # Method removed - recordings no longer store features
     
+    def update_segments(self, updates: Dict[int, Dict[str, Any]]) -> int:
+        """
+        Apply per-segment field updates in a single table write.
+
+        Args:
+            updates: {doc_id: {field: value}} for each segment to update
+
+        Returns:
+            Number of segments updated
+        """
+        for doc_id in updates:
+            self._segment_cache.pop(doc_id, None)
+        return self._update_many(self.segments_db, updates, "segments")
+
+    def update_presets(self, updates: Dict[int, Dict[str, Any]]) -> int:
+        """Apply per-preset field updates in a single table write (see update_segments)."""
+        return self._update_many(self.presets_db, updates, "presets")
+
+    def _update_many(self, table, updates: Dict[int, Dict[str, Any]], name: str) -> int:
+        """Update many documents with different fields through one table write."""
+        try:
+            doc_ids = [doc_id for doc_id in updates if table.contains(doc_id=doc_id)]
+            if not doc_ids:
+                return 0
+
+            # Updates may move FAISS_index values or indexed fields; rebuild on next lookup
+            self._faiss_to_doc = None
+            self._embedded_counts.pop(name, None)
+            for key in [key for key in self._field_indexes if key[0] == name]:
+                del self._field_indexes[key]
+
+            updated = table.update_by_id({doc_id: updates[doc_id] for doc_id in doc_ids})
+            table.storage.flush()
+            logger.debug(f"Updated {len(updated)} {name} in batch")
+            return len(updated)
+
+        except Exception as e:
+            logger.error(f"Failed to update {name} in batch: {e}")
+            return 0
+
     def update_segment_features(self, doc_id: int, features: Dict[str, Any]) -> bool:
         """Update segment features by document ID."""
         try:
-            Q = Query()
-            updated_count = self.segments_db.update({'features': features}, doc_id=doc_id)
+            self._segment_cache.pop(doc_id, None)
+            updated_count = self.segments_db.update({'features': features}, doc_ids=[doc_id])
             if updated_count:
                 logger.info(f"Updated segment {doc_id} features")
                 return True
@@ -8,9 +8,10 @@ Visualization tools for audio analysis results.
 
 import numpy as np
 import librosa
-import matplotlib.pyplot as plt
 import logging
 from typing import Dict, Any, Optional
+from .audio_loader import load_audio
+from .energy_analyzer import EnergyAnalyzer
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +27,7 @@ class AudioVisualizer:
             sample_rate: Target sample rate for analysis
         """
         self.sample_rate = sample_rate
+        self.energy_analyzer = EnergyAnalyzer(sample_rate)
         
     def visualize_segment_multiband(self, audio_path: str, start_time: float = 0.0, 
                                    end_time: Optional[float] = None) -> None:
@@ -39,7 +41,7 @@ class AudioVisualizer:
         """
         try:
             # Load audio file
-            y, sr = librosa.load(audio_path, sr=None)  # Preserve original sample rate
+            y, sr = load_audio(audio_path)  # Preserve original sample rate
             
             # Handle time segment
             total_duration = len(y) / sr
@@ -48,43 +50,46 @@ class AudioVisualizer:
             start_sample = int(start_time * sr)
             end_sample = int(end_time * sr)
             y_segment = y[start_sample:end_sample]
-            duration = len(y_segment) / sr
             
             if len(y_segment) == 0:
                 logger.error(f"Invalid time segment: {start_time}s to {end_time}s")
                 return
                 
-            # Multi-band onset detection using IQR
-            bands = {
-                'Low-mid (150-2000 Hz)': {'fmin': 150, 'fmax': 2000},
-                'Mid (500-4000 Hz)': {'fmin': 500, 'fmax': 4000},
-                'High-mid (2000-8000 Hz)': {'fmin': 2000, 'fmax': 8000}
-            }
+            self.visualize_segment_multiband_audio(
+                y_segment, sr, f"{audio_path} ({start_time:.1f}s - {end_time:.1f}s)"
+            )
+                
+        except Exception as e:
+            logger.error(f"Visualization failed for {audio_path}: {e}")
+            
+    def visualize_segment_multiband_audio(self, y_segment: np.ndarray, sr: int,
+                                          label: str = "") -> None:
+        """
+        Visualize multi-band onset detection for already decoded segment audio.
+        
+        Args:
+            y_segment: Mono audio samples of the segment
+            sr: Sample rate of y_segment
+            label: Title suffix for the spectrogram (e.g. file and time range)
+        """
+        try:
+            # Multi-band onset detection using IQR (same analysis as EnergyAnalyzer),
+            # with the spectrogram drawn from the STFT the bands are computed from
+            analyzer = self.energy_analyzer
+            hop_length = analyzer.HOP_LENGTH
+            power = np.abs(librosa.stft(y_segment, hop_length=hop_length)) ** 2
+            envelopes = analyzer.band_onset_envelopes(y_segment, sr, power)
             
             onset_results = {}
-            for band_name, freq_range in bands.items():
-                # Compute onset strength for this frequency band
-                band_onset_strength = librosa.onset.onset_strength(
-                    y=y_segment,
-                    sr=sr,
-                    fmin=freq_range['fmin'],
-                    fmax=freq_range['fmax']
-                )
+            for band_key, band_onset_strength in envelopes.items():
+                freq_range = analyzer.BANDS[band_key]
+                band_name = (f"{band_key.replace('_', '-').capitalize()} "
+                             f"({freq_range['fmin']}-{freq_range['fmax']} Hz)")
                 
-                # Calculate IQR-based delta for this band
-                q75, q25 = np.percentile(band_onset_strength, [75, 25])
-                band_delta = float((q75 - q25) * 0.5)
-                
-                # Detect onsets in this band
-                band_onset_frames = librosa.onset.onset_detect(
-                    onset_envelope=band_onset_strength,
-                    sr=sr,
-                    units='frames',
-                    delta=band_delta
-                )
+                band_onset_frames, band_delta = analyzer.detect_band_onsets(band_onset_strength, sr, band_key)
                 
                 # Convert frames to times
-                band_onset_times = librosa.frames_to_time(band_onset_frames, sr=sr)
+                band_onset_times = librosa.frames_to_time(band_onset_frames, sr=sr, hop_length=hop_length)
                 
                 onset_results[band_name] = {
                     'frames': band_onset_frames,
@@ -96,14 +101,15 @@ class AudioVisualizer:
                 
                 logger.info(f"{band_name}: {len(band_onset_frames)} onsets, delta={band_delta:.3f}")
             
-            # Create visualization
+            # Create visualization (matplotlib is only loaded when a plot is requested)
+            import matplotlib.pyplot as plt
+            import librosa.display
             fig, axes = plt.subplots(nrows=4, sharex=True, figsize=(14, 12))
             
             # Spectrogram on top
-            D = np.abs(librosa.stft(y_segment))
-            librosa.display.specshow(librosa.amplitude_to_db(D, ref=np.max),
+            librosa.display.specshow(librosa.power_to_db(power, ref=np.max),
                                      x_axis='time', y_axis='log', ax=axes[0], sr=sr)
-            axes[0].set(title=f'Power spectrogram - {audio_path} ({start_time:.1f}s - {end_time:.1f}s)')
+            axes[0].set(title=f'Power spectrogram - {label}')
             axes[0].label_outer()
             
             # Plot each frequency band
@@ -130,7 +136,7 @@ class AudioVisualizer:
                 logger.info(f"  {band_name}: {result['count']} onsets at [{times_str}]")
                 
         except Exception as e:
-            logger.error(f"Visualization failed for {audio_path}: {e}")
+            logger.error(f"Visualization failed for {label}: {e}")
             
     def visualize_segment_from_db(self, db_manager, segment_id: str) -> None:
         """
@@ -0,0 +1,154 @@
+"""
+Hibikidō Command Handler Tests
+==============================
+
+Recording and segment ingest against a real database, with the embedding model
+and the OSC client replaced by recorders (no torch required).
+"""
+
+import json
+import numpy as np
+import pytest
+import soundfile as sf
+from hibikido import audio_loader
+from hibikido.command_handlers import CommandHandlers
+from hibikido.orchestrator import Orchestrator
+from hibikido.server_config import get_default_config
+from hibikido.text_processor import TextProcessor
+from hibikido.tinydb_manager import HibikidoDatabase
+
+
+class RecordingEmbeddings:
+    """Stands in for EmbeddingManager: hands out consecutive FAISS ids."""
+
+    def __init__(self):
+        self.next_id = 0
+        self.added = []
+        self.discarded = []
+
+    def add_embedding(self, text):
+        return self.add_embeddings([text])[0]
+
+    def add_embeddings(self, texts):
+        self.added.append(list(texts))
+        faiss_ids = list(range(self.next_id, self.next_id + len(texts)))
+        self.next_id += len(texts)
+        return faiss_ids
+
+    def discard_embeddings(self, faiss_ids):
+        self.discarded.append(list(faiss_ids))
+        return True
+
+
+class RecordingOSC:
+    def __init__(self):
+        self.errors = []
+        self.confirms = []
+
+    def send_error(self, message):
+        self.errors.append(message)
+
+    def send_confirm(self, message):
+        self.confirms.append(message)
+
+
+def write_tone(path, seconds=2.0, sr=22050):
+    t = np.arange(int(sr * seconds)) / sr
+    sf.write(str(path), (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32), sr)
+
+
+@pytest.fixture
+def handlers(tmp_path):
+    audio_dir = tmp_path / "audio"
+    audio_dir.mkdir()
+    write_tone(audio_dir / "tone.wav")
+
+    config = get_default_config()
+    config['database']['data_dir'] = str(tmp_path / "database")
+    config['audio']['audio_directory'] = str(audio_dir)
+
+    db = HibikidoDatabase(data_dir=config['database']['data_dir'])
+    db.connect()
+    db.add_recording("tone.wav", {"description": "a steady tone", "duration": 2.0})
+
+    command_handlers = CommandHandlers(config, db, RecordingEmbeddings(), TextProcessor(),
+                                       RecordingOSC(), Orchestrator())
+    yield command_handlers
+    db.close()
+
+
+def test_add_recording(handlers):
+    write_tone(f"{handlers._audio_dir}/new.wav", seconds=1.5)
+
+    handlers.handle_add_recording("/add_recording", "new.wav", "a new tone")
+
+    assert not handlers.osc_handler.errors
+    assert handlers.osc_handler.confirms == ["added recording: new.wav with auto-segment"]
+    assert handlers.db_manager.get_recording_by_path("new.wav")["duration"] == pytest.approx(1.5)
+    assert handlers.db_manager.get_segment_by_faiss_id(0)["segmentation_id"] == "auto_full"
+    assert audio_loader._load_cached.cache_info().currsize == 0, "Decoded recording is released"
+
+
+def test_add_recording_writes_nothing_when_decode_fails(handlers, monkeypatch):
+    """A file whose header reads but whose data does not decode leaves no recording or vector."""
+    write_tone(f"{handlers._audio_dir}/broken.wav")
+
+    def fail(path):
+        raise RuntimeError("truncated data")
+
+    monkeypatch.setattr("hibikido.command_handlers.load_audio", fail)
+    handlers.handle_add_recording("/add_recording", "broken.wav", "a broken tone")
+
+    assert handlers.osc_handler.errors == ["failed to load audio file: truncated data"]
+    assert handlers.db_manager.get_recording_by_path("broken.wav") is None
+    assert not handlers.embedding_manager.added
+
+
+def add_batch(command_handlers, entries):
+    command_handlers.handle_add_segments_batch("/add_segments_batch", "tone.wav", json.dumps(entries))
+
+
+def test_add_segments_batch(handlers):
+    add_batch(handlers, [
+        {"start": 0.0, "end": 0.5, "description": "attack"},
+        {"start": 0.5, "end": 1.0, "description": "sustain", "segmentation_id": "onsets"}
+    ])
+
+    assert not handlers.osc_handler.errors
+    assert handlers.osc_handler.confirms == ["added 2 segments for tone.wav"]
+    assert len(handlers.embedding_manager.added) == 1, "One batched encode per request"
+
+    segments = handlers.db_manager.get_segments_by_recording_path("tone.wav")
+    assert [s["FAISS_index"] for s in segments] == [0, 1]
+    assert [s["segmentation_id"] for s in segments] == ["manual", "onsets"]
+    assert all(len(s["bark_bands_raw"]) == Orchestrator.BARK_BANDS for s in segments)
+    assert handlers.db_manager.get_segment_by_faiss_id(1)["description"] == "sustain"
+    assert audio_loader._load_cached.cache_info().currsize == 0, "Decoded recording is released"
+
+
+@pytest.mark.parametrize("entries, error", [
+    ([{"start": 0.0, "end": 0.5, "description": "ok"}, {"start": 0.6, "end": 0.4, "description": "bad"}],
+     "segment 1 has invalid start/end values (must be 0.0-1.0)"),
+    ([{"start": 0.0, "end": 0.5}], "segment 0 requires description"),
+    ([], "segments JSON must be a non-empty list"),
+])
+def test_add_segments_batch_validates_before_embedding(handlers, entries, error):
+    add_batch(handlers, entries)
+
+    assert handlers.osc_handler.errors == [error]
+    assert not handlers.embedding_manager.added
+    assert len(handlers.db_manager.segments_db) == 0
+
+
+def test_add_segments_batch_discards_vectors_when_storage_fails(handlers, monkeypatch):
+    """FAISS ids handed out for a batch the database rejected are given back."""
+    monkeypatch.setattr(handlers.db_manager, "add_segments", lambda segments: [])
+
+    add_batch(handlers, [
+        {"start": 0.0, "end": 0.5, "description": "attack"},
+        {"start": 0.5, "end": 1.0, "description": "sustain"}
+    ])
+
+    assert handlers.osc_handler.errors == ["failed to add segments to database"]
+    assert handlers.embedding_manager.discarded == [[0, 1]]
+    assert not handlers.osc_handler.confirms
@@ -0,0 +1,193 @@
+"""
+Hibikidō Database Tests
+=======================
+
+Lookups through the in-memory indexes, batch writes and JSON storage.
+"""
+
+import math
+import numpy as np
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import JSONStorage
+from hibikido.tinydb_manager import HibikidoDatabase, OrjsonStorage
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = HibikidoDatabase(data_dir=str(tmp_path))
+    assert database.connect()
+    yield database
+    database.close()
+
+
+def segment(source_path, start, faiss_index, description="segment"):
+    """Segment dict as built by handle_add_segments_batch."""
+    return {
+        "source_path": source_path,
+        "segmentation_id": "manual",
+        "start": start,
+        "end": start + 1.0,
+        "description": description,
+        "embedding_text": description,
+        "FAISS_index": faiss_index,
+        "bark_bands_raw": [0.0] * 24,
+        "bark_norm": 0.0,
+        "onset_times_low_mid": [],
+        "onset_times_mid": [],
+        "onset_times_high_mid": [],
+        "features": {}
+    }
+
+
+def preset(effect_path, faiss_index, description="preset"):
+    return {
+        "effect_path": effect_path,
+        "parameters": [0.5],
+        "description": description,
+        "embedding_text": description,
+        "FAISS_index": faiss_index
+    }
+
+
+def test_field_indexes_follow_inserts(db):
+    """Path and ID lookups see documents added after the index was built."""
+    assert db.add_recording("a.wav", {"description": "a", "duration": 2.0})
+    assert db.get_recording_by_path("b.wav") is None  # Builds the path index
+
+    assert db.add_recording("b.wav", {"description": "b", "duration": 3.0})
+    assert db.get_recording_by_path("b.wav")["duration"] == 3.0
+    assert not db.add_recording("b.wav", {"description": "again"}), "Duplicate paths are rejected"
+
+    assert db.add_segmentation("manual", "manual")
+    assert not db.add_segmentation("manual", "other")
+    assert db.get_segmentation("manual")["method"] == "manual"
+
+    assert db.add_effect("reverb", "Reverb")
+    assert not db.add_effect("reverb", "Reverb again")
+    assert db.get_effect_by_path("reverb")["name"] == "Reverb"
+
+
+def test_segments_by_recording_sorted_by_start(db):
+    assert db.get_segments_by_recording_path("a.wav") == []
+    db.add_segments([segment("a.wav", 4.0, 0), segment("b.wav", 0.0, 1), segment("a.wav", 1.0, 2)])
+    db.add_segment("a.wav", "manual", 2.0, 3.0, "single", "single", 3,
+                   [0.0] * 24, 0.0, [], [], [], {})
+
+    starts = [s["start"] for s in db.get_segments_by_recording_path("a.wav")]
+    assert starts == [1.0, 2.0, 4.0]
+
+
+def test_faiss_map_resolves_segments_before_presets(db):
+    """get_by_faiss_ids matches get_segment_by_faiss_id then get_preset_by_faiss_id."""
+    db.add_segments([segment("a.wav", 0.0, 0, "first"), segment("a.wav", 1.0, 1)])
+    db.add_presets([preset("reverb", 1, "shadowed"), preset("reverb", 2, "hall")])
+
+    found = db.get_by_faiss_ids([0, 1, 2, 99])
+    assert sorted(found) == [0, 1, 2]
+    assert found[0][0] == "segments" and found[0][1]["description"] == "first"
+    assert found[1][0] == "segments"
+    assert found[2] == ("presets", db.get_preset_by_faiss_id(2))
+
+    # Inserts after the map was built are visible
+    db.add_segment("b.wav", "manual", 0.0, 1.0, "late", "late", 5,
+                   [0.0] * 24, 0.0, [], [], [], {})
+    db.add_preset("delay", [0.1], "echo", "echo", faiss_index=6)
+    assert db.get_segment_by_faiss_id(5)["description"] == "late"
+    assert db.get_preset_by_faiss_id(6)["description"] == "echo"
+    assert db.get_segment_by_faiss_id(6) is None
+
+
+def test_embedding_counts(db):
+    """A FAISS_index field counts as embedded, even when it is None."""
+    db.add_segments([segment("a.wav", 0.0, 0), segment("a.wav", 1.0, None)])
+    db.add_preset("reverb", [0.5], "no index", "no index")
+    stats = db.get_stats()
+    assert stats["segments_with_embeddings"] == 2
+    assert stats["presets_with_embeddings"] == 0
+
+    db.add_preset("reverb", [0.7], "indexed", "indexed", faiss_index=3)
+    preset_id = db.presets_db.all()[0].doc_id
+    assert db.update_presets({preset_id: {"FAISS_index": 4}}) == 1
+    stats = db.get_stats()
+    assert stats["presets_with_embeddings"] == 2
+    assert stats["total_searchable_items"] == 4
+    assert db.get_preset_by_faiss_id(4)["description"] == "no index"
+
+
+def test_update_segments_applies_each_documents_fields(db):
+    """Every document gets its own fields whatever order the updates are given in."""
+    doc_ids = db.add_segments([segment("a.wav", float(i), None) for i in range(5)])
+    db.get_segment_by_doc_id(doc_ids[0])  # Cached copy must be dropped
+
+    updates = {doc_id: {"FAISS_index": 10 + i, "description": f"updated {i}"}
+               for i, doc_id in reversed(list(enumerate(doc_ids)))}
+    updates[999] = {"FAISS_index": 99}  # Missing documents are skipped
+    assert db.update_segments(updates) == 5
+
+    for i, doc_id in enumerate(doc_ids):
+        document = db.get_segment_by_doc_id(doc_id)
+        assert document["FAISS_index"] == 10 + i
+        assert document["description"] == f"updated {i}"
+        assert document["start"] == float(i)
+        assert db.get_segment_by_faiss_id(10 + i) == document
+
+    assert db.update_segments({999: {"FAISS_index": 1}}) == 0
+
+
+def test_batch_writes_survive_reopen(tmp_path):
+    """Bulk inserts and updates reach disk without waiting for close()."""
+    database = HibikidoDatabase(data_dir=str(tmp_path))
+    database.connect()
+    doc_ids = database.add_segments([segment("a.wav", 0.0, 0), segment("a.wav", 1.0, 1)])
+    database.add_presets([preset("reverb", 2)])
+    database.update_segments({doc_ids[1]: {"description": "kept"}})
+
+    reopened = HibikidoDatabase(data_dir=str(tmp_path))
+    reopened.connect()
+    try:
+        assert len(reopened.segments_db) == 2
+        assert reopened.get_segment_by_faiss_id(1)["description"] == "kept"
+        assert reopened.get_preset_by_faiss_id(2)["effect_path"] == "reverb"
+    finally:
+        reopened.close()
+        database.close()
+
+
+def test_orjson_storage_round_trip(tmp_path):
+    """OrjsonStorage keeps NaN/Infinity and NumPy values, and reads files JSONStorage wrote."""
+    pytest.importorskip("orjson")
+    path = str(tmp_path / "values.json")
+    document = {
+        "nan": float("nan"),
+        "inf": float("inf"),
+        "float32": np.float32(0.5),
+        "array": np.arange(3, dtype=np.float64),
+        "none": None,
+        "text": "響き道"
+    }
+
+    with TinyDB(path, storage=OrjsonStorage) as table:
+        table.insert(document)
+    with TinyDB(path, storage=JSONStorage) as table:
+        stored = table.all()[0]
+    assert math.isnan(stored["nan"])
+    assert stored["inf"] == math.inf
+    assert stored["float32"] == 0.5
+    assert stored["array"] == [0.0, 1.0, 2.0]
+    assert stored["none"] is None
+    assert stored["text"] == "響き道"
+
+    # Finite data goes through orjson and reads back the same
+    with TinyDB(path, storage=OrjsonStorage) as table:
+        table.truncate()
+        table.insert({"values": np.array([1.5, -2.0]), "none": None})
+    with TinyDB(path, storage=OrjsonStorage) as table:
+        assert table.all() == [{"values": [1.5, -2.0], "none": None}]
+
+    # Legacy files holding NaN are still readable
+    legacy = str(tmp_path / "legacy.json")
+    with TinyDB(legacy, storage=JSONStorage) as table:
+        table.insert({"value": float("nan")})
+    with TinyDB(legacy, storage=OrjsonStorage) as table:
+        assert math.isnan(table.all()[0]["value"])
@@ -0,0 +1,185 @@
+"""
+Hibikidō Orchestrator Tests
+===========================
+
+Niche management, the bounded queue and the incrementally cached ecosystem.
+"""
+
+import random
+import numpy as np
+import pytest
+from hibikido.orchestrator import Orchestrator
+
+pytestmark = pytest.mark.orchestrator
+
+
+def band(n, level=1.0):
+    """Bark vector with energy in a single band (orthogonal to every other band)."""
+    bands = [0.0] * Orchestrator.BARK_BANDS
+    bands[n] = level
+    return bands
+
+
+def manifestation(index, bark_bands_raw):
+    """Minimal manifestation data as built by handle_invoke."""
+    return {
+        "index": index,
+        "collection": "segments",
+        "score": 0.9,
+        "path": f"sound_{index}.wav",
+        "description": f"sound {index}",
+        "start": 0.0,
+        "end": 1.0,
+        "parameters": "{}",
+        "sound_id": str(index),
+        "bark_bands_raw": bark_bands_raw
+    }
+
+
+def make_orchestrator(**kwargs):
+    """Orchestrator recording every manifestation it sends: [(manifestation_id, path)]."""
+    orchestrator = Orchestrator(**kwargs)
+    sent = []
+    orchestrator.set_manifest_callback(lambda mid, collection, score, path, *rest: sent.append((mid, path)))
+    return orchestrator, sent
+
+
+def test_conflicting_sounds_wait_for_a_free_niche():
+    """A sound too similar to the ecosystem is queued until its niche frees up."""
+    orchestrator, sent = make_orchestrator()
+
+    assert orchestrator.queue_manifestation(manifestation(0, band(0)))
+    assert orchestrator.queue_manifestation(manifestation(1, band(0)))   # Same band - conflicts
+    assert orchestrator.queue_manifestation(manifestation(2, band(5)))   # Orthogonal - fits
+
+    assert [path for _, path in sent] == ["sound_0.wav", "sound_2.wav"]
+    assert len(orchestrator.queue) == 1
+
+    assert orchestrator.free_manifestation(sent[0][0])
+    assert [path for _, path in sent] == ["sound_0.wav", "sound_2.wav", "sound_1.wav"]
+    assert not orchestrator.queue
+    assert len({mid for mid, _ in sent}) == 3, "Manifestation IDs must be unique"
+
+
+def test_queue_is_bounded():
+    """Queued sounds never exceed max_queue_size; available_slots reports what is left."""
+    orchestrator, sent = make_orchestrator(max_queue_size=2)
+
+    assert orchestrator.queue_manifestation(manifestation(0, band(0)))  # Manifests
+    assert orchestrator.available_slots() == 2
+    assert orchestrator.queue_manifestation(manifestation(1, band(0)))
+    assert orchestrator.queue_manifestation(manifestation(2, band(0)))
+    assert orchestrator.available_slots() == 0
+
+    assert not orchestrator.queue_manifestation(manifestation(3, band(7)))
+    assert len(orchestrator.queue) == 2
+    assert len(sent) == 1
+
+
+def test_queue_is_unbounded_by_default():
+    orchestrator, sent = make_orchestrator()
+
+    for index in range(250):
+        assert orchestrator.queue_manifestation(manifestation(index, band(0)))
+
+    assert len(orchestrator.queue) == 249
+    assert orchestrator.available_slots() > 0
+
+
+@pytest.mark.parametrize("bark_bands_raw", [
+    [1.0] * (Orchestrator.BARK_BANDS - 1),
+    [1.0] * (Orchestrator.BARK_BANDS + 1),
+    [[1.0] * Orchestrator.BARK_BANDS],
+])
+def test_malformed_bark_vectors_are_rejected(bark_bands_raw):
+    """Only vectors of BARK_BANDS values reach the conflict kernels."""
+    orchestrator, sent = make_orchestrator()
+    orchestrator.queue_manifestation(manifestation(0, band(3)))
+
+    assert not orchestrator.queue_manifestation(manifestation(1, bark_bands_raw))
+    assert not orchestrator.queue
+    assert len(sent) == 1
+
+
+def test_unchanged_ecosystem_skips_queue_passes():
+    """Queued sounds are only re-checked after the ecosystem changes."""
+    orchestrator, sent = make_orchestrator()
+    orchestrator.queue_manifestation(manifestation(0, band(0)))
+    orchestrator.queue_manifestation(manifestation(1, band(0)))
+    orchestrator.queue_manifestation(manifestation(2, band(0)))
+
+    checks = []
+    find_conflict = orchestrator._find_conflict
+    orchestrator._find_conflict = lambda vector: checks.append(vector) or find_conflict(vector)
+
+    orchestrator.process_queue()
+    assert not checks, "Nothing changed, so no queued sound can fit"
+
+    # A new sound is checked alone; the queued ones still conflict
+    orchestrator.queue_manifestation(manifestation(3, band(9)))
+    assert len(checks) == 1
+    assert [path for _, path in sent] == ["sound_0.wav", "sound_3.wav"]
+
+    # Freeing a niche re-checks the queue in FIFO order
+    orchestrator.free_manifestation(sent[0][0])
+    assert [path for _, path in sent][2:] == ["sound_1.wav"]
+    assert [entry.data["index"] for entry in orchestrator.queue] == [2]
+
+
+def test_bundle_callback_takes_precedence():
+    """With a bundle callback the manifestation and its niche go out in one call."""
+    orchestrator = Orchestrator()
+    bundles, manifests = [], []
+    orchestrator.set_manifest_callback(lambda *args: manifests.append(args))
+    orchestrator.set_bundle_callback(lambda *args: bundles.append(args))
+
+    orchestrator.queue_manifestation(manifestation(0, band(4, 0.5)))
+
+    assert not manifests
+    assert len(bundles) == 1
+    assert bundles[0][-1] == band(4, 0.5)
+
+
+def random_niches(orchestrator, sent, steps=400, seed=5):
+    """Manifest and free random sounds, yielding the active {manifestation_id: bands} after each step."""
+    rng = random.Random(seed)
+    active = {}
+    for step in range(steps):
+        if active and rng.random() < 0.45:
+            manifestation_id = rng.choice(sorted(active))
+            assert orchestrator.free_manifestation(manifestation_id)
+            del active[manifestation_id]
+        else:
+            bands = [rng.uniform(0.0, 3.0) for _ in range(Orchestrator.BARK_BANDS)]
+            orchestrator.queue_manifestation(manifestation(step, bands))
+            active[sent[-1][0]] = bands
+        yield active
+
+
+def test_incremental_ecosystem_matches_full_recompute():
+    """Adding and subtracting niches, with periodic resync, keeps the ecosystem exact."""
+    # Threshold above any cosine similarity: every sound manifests
+    orchestrator, sent = make_orchestrator(bark_similarity_threshold=2.0)
+    orchestrator.ECOSYSTEM_RESYNC_INTERVAL = 7
+
+    for active in random_niches(orchestrator, sent):
+        expected = np.sum(list(active.values()), axis=0) if active else np.zeros(Orchestrator.BARK_BANDS)
+        np.testing.assert_allclose(orchestrator.ecosystem_raw, expected, rtol=1e-9, atol=1e-9)
+        norm = np.linalg.norm(expected)
+        np.testing.assert_allclose(orchestrator.ecosystem_norm, expected / norm if norm else expected,
+                                   rtol=1e-9, atol=1e-9)
+
+    assert not orchestrator.free_manifestation("missing")
+
+
+def test_niche_rows_follow_swap_remove():
+    """Freed rows are filled from the end and the matrix grows past its initial capacity."""
+    orchestrator, sent = make_orchestrator(bark_similarity_threshold=2.0)
+
+    for active in random_niches(orchestrator, sent):
+        assert sorted(orchestrator._niche_ids) == sorted(active)
+        for row, manifestation_id in enumerate(orchestrator._niche_ids):
+            assert orchestrator._niche_rows[manifestation_id] == row
+            np.testing.assert_array_equal(orchestrator._niche_matrix[row], active[manifestation_id])
+
+    assert len(orchestrator._niche_matrix) > Orchestrator.NICHE_CAPACITY, "Matrix should have grown"
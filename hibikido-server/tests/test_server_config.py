@@ -0,0 +1,54 @@
+"""
+Hibikidō Configuration Tests
+============================
+
+Default settings, config file loading and copy-on-write merging.
+"""
+
+from hibikido.server_config import get_default_config, load_config, merge_config
+
+
+def test_merge_config_copies_only_overridden_sections():
+    base = get_default_config()
+    override = {
+        'search': {'top_k': 25},
+        'osc': {'listen_port': 9100},
+        'custom': {'nested': {'value': 1}}
+    }
+
+    merged = merge_config(base, override)
+
+    assert merged['search'] == {'top_k': 25, 'min_score': 0.3}
+    assert merged['osc']['listen_port'] == 9100
+    assert merged['osc']['send_port'] == 9001
+    assert merged['custom'] == {'nested': {'value': 1}}
+
+    # base_config is left untouched; sections without overrides are shared
+    assert base == get_default_config()
+    assert merged['search'] is not base['search']
+    assert merged['database'] is base['database']
+
+
+def test_merge_config_nested_overrides():
+    base = {'a': {'b': {'c': 1, 'd': 2}, 'e': 3}}
+    merged = merge_config(base, {'a': {'b': {'c': 10}, 'f': 4}})
+
+    assert merged == {'a': {'b': {'c': 10, 'd': 2}, 'e': 3, 'f': 4}}
+    assert base == {'a': {'b': {'c': 1, 'd': 2}, 'e': 3}}
+
+
+def test_default_config_copies_are_independent():
+    config = get_default_config()
+    config['search']['top_k'] = 1
+
+    assert get_default_config()['search']['top_k'] == 10
+
+
+def test_load_config(tmp_path):
+    config_file = tmp_path / "config.json"
+    config_file.write_text('{"search": {"top_k": 5}}', encoding='utf-8')
+    assert load_config(str(config_file)) == {'search': {'top_k': 5}}
+
+    config_file.write_text('{not json', encoding='utf-8')
+    assert load_config(str(config_file)) == {}
+    assert load_config(str(tmp_path / "missing.json")) == {}